@@ -0,0 +1,50 @@
+# Backward scheduler overhead on long chains of scalar ops: the time per
+# node should stay flat as the graph grows (the old sort-per-push
+# scheduler grew with N log N per node).
+#
+#   python benchmarks/bench_backward.py [max_nodes]
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import sys
+import time
+import numpy as np
+from dezero import Variable
+
+
+def chain(n):
+    x = Variable(np.array(1.0))
+    y = x
+    for _ in range(n):
+        y = y + 1.0
+    return x, y
+
+
+def wide_chain(n):
+    # every step reads the previous two, so the heap holds more than one
+    # function at a time
+    x = Variable(np.array(1.0))
+    a, b = x, x * 1.0
+    for _ in range(n // 2):
+        a, b = b, (a + b) * 0.5
+    return x, b
+
+
+def main(max_nodes):
+    print('{:<12} {:>10} {:>14} {:>14}'.format(
+        'graph', 'nodes', 'backward s', 'ns/node'))
+    n = 1000
+    while n <= max_nodes:
+        for name, build in (('chain', chain), ('two-lane', wide_chain)):
+            x, y = build(n)
+            start = time.perf_counter()
+            y.backward()
+            elapsed = time.perf_counter() - start
+            print('{:<12} {:>10} {:>14.3f} {:>14.0f}'.format(
+                name, n, elapsed, elapsed / n * 1e9))
+            del x, y
+        n *= 10
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6)
@@ -0,0 +1,75 @@
+# Peak memory and time of one training step on a deep elementwise network,
+# plain against checkpointed segments: a checkpointed segment keeps only
+# its input and runs its forward a second time during backward.
+#
+#   python benchmarks/bench_checkpoint.py [depth] [size]
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import sys
+import time
+import tracemalloc
+import numpy as np
+from dezero import Variable, checkpoint
+
+
+def make_params(depth, size):
+    np.random.seed(0)
+    return [(Variable(1 + 0.1 * np.random.randn(size)),
+             Variable(0.1 * np.random.randn(size))) for _ in range(depth)]
+
+
+def layer(h, W, b):
+    h = h * W + b
+    return h / (1 + h * h)  # a bounded activation out of the basic ops
+
+
+def segment(params):
+    def f(h):
+        for W, b in params:
+            h = layer(h, W, b)
+        return h
+    return f
+
+
+def step(x, params, every):
+    for W, b in params:
+        W.cleargrad()
+        b.cleargrad()
+    h = Variable(x)
+    if every:
+        for i in range(0, len(params), every):
+            h = checkpoint(segment(params[i:i + every]), h)
+    else:
+        h = segment(params)(h)
+    loss = h * h
+    loss.backward()
+    return [W.grad for W, b in params]
+
+
+def main(depth, size):
+    params = make_params(depth, size)
+    x = np.random.randn(size)
+    print('{:<12} {:>12} {:>10}'.format('segments of', 'peak MiB', 'ms'))
+    base = None
+    for every in (0, 2, 4, 8, 16):
+        if every > depth:
+            break
+        tracemalloc.start()
+        start = time.perf_counter()
+        grads = step(x, params, every)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        if base is None:
+            base = grads
+        else:
+            assert all(np.array_equal(g0, g1) for g0, g1 in zip(base, grads))
+        print('{:<12} {:>12.1f} {:>10.1f}'.format(
+            every or 'none', peak / 2**20, elapsed * 1e3))
+
+
+if __name__ == '__main__':
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 10 ** 5
+    main(depth, size)
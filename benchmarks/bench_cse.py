@@ -0,0 +1,62 @@
+# Common subexpression elimination on the step24 test functions: forward
+# plus backward with and without using_cse(). goldstein repeats x**2,
+# x*y and friends, so cse has nodes to share; sphere and matyas show the
+# cost of the key and snapshot checks when there is little to share.
+#
+#   python benchmarks/bench_cse.py [iters]
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import contextlib
+import sys
+import time
+import numpy as np
+from dezero import Variable, using_cse
+
+
+def sphere(x, y):
+    return x ** 2 + y ** 2
+
+
+def matyas(x, y):
+    return 0.26 * (x ** 2 + y ** 2) - 0.48 * x * y
+
+
+def goldstein(x, y):
+    z = (1 + (x + y + 1)**2 * (19 - 14*x + 3*x**2 - 14*y + 6*x*y + 3*y**2)) * \
+        (30 + (2*x - 3*y)**2 * (18 - 32*x + 12*x**2 + 48*y - 36*x*y + 27*y**2))
+    return z
+
+
+def run(f, iters, cse):
+    x = Variable(np.array(1.0))
+    y = Variable(np.array(1.0))
+    with using_cse() if cse else contextlib.nullcontext():
+        start = time.perf_counter()
+        for _ in range(iters):
+            x.cleargrad()
+            y.cleargrad()
+            z = f(x, y)
+            z.backward()
+        elapsed = time.perf_counter() - start
+    return elapsed, (x.grad, y.grad)
+
+
+def main(iters, repeat=5):
+    print('{:<10} {:>12} {:>12}'.format('function', 'plain us', 'cse us'))
+    for f in (sphere, matyas, goldstein):
+        best = [float('inf'), float('inf')]
+        for _ in range(repeat):
+            for i, cse in enumerate((False, True)):
+                t, grads = run(f, iters, cse)
+                best[i] = min(best[i], t)
+                if not cse:
+                    expected = grads
+                else:
+                    np.testing.assert_allclose(grads, expected)
+        print('{:<10} {:>12.1f} {:>12.1f}'.format(
+            f.__name__, best[0] / iters * 1e6, best[1] / iters * 1e6))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
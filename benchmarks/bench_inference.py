@@ -0,0 +1,55 @@
+# Latency of a per-sample prediction loop in the style of steps/step59.py:
+# 1000 calls on single-element inputs, under no_grad() and under
+# inference_mode(), where op dispatch goes straight to the kernels.
+#
+#   python benchmarks/bench_inference.py [samples]
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import contextlib
+import sys
+import time
+import numpy as np
+from dezero import Variable, no_grad, inference_mode
+
+
+def make_model():
+    np.random.seed(0)
+    W1, b1, W2, b2 = [Variable(np.random.randn(1)) for _ in range(4)]
+
+    def predict(x, h):
+        # one step of a tiny recurrent cell out of elementwise ops
+        h = (x * W1 + h * 0.5 + b1) / (1.0 + h * h)
+        return h * W2 + b2, h
+    return predict
+
+
+def run(predict, samples, mode, repeat=5):
+    xs = [np.array([np.sin(i * 0.01)]) for i in range(samples)]
+    best = float('inf')
+    for _ in range(repeat):
+        with mode():
+            h = np.zeros(1)
+            start = time.perf_counter()
+            for x in xs:
+                y, h = predict(x, h)
+            best = min(best, time.perf_counter() - start)
+    return best, y.data
+
+
+def main(samples):
+    predict = make_model()
+    print('{:<16} {:>10} {:>12}'.format('mode', 'total ms', 'us/sample'))
+    results = []
+    for name, mode in (('graph', contextlib.nullcontext),
+                       ('no_grad', no_grad),
+                       ('inference_mode', inference_mode)):
+        t, y = run(predict, samples, mode)
+        results.append(y)
+        print('{:<16} {:>10.2f} {:>12.2f}'.format(
+            name, t * 1e3, t / samples * 1e6))
+    assert all(np.array_equal(y, results[0]) for y in results)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,88 @@
+# Time to a target loss for LBFGS against SGD on full-batch problems: the
+# linear regression of steps/step42.py and rosenbrock from steps/step28.py.
+# This core has no matmul, so the regression loss is written from the
+# data moments, which is the same function of the scalars W and b.
+#
+#   python benchmarks/bench_lbfgs.py
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import time
+import numpy as np
+from dezero import Variable
+from dezero.optimizers import SGD, LBFGS
+
+
+def regression():
+    np.random.seed(0)
+    x = np.random.rand(100, 1)
+    y = 5 + 2 * x + np.random.rand(100, 1)
+    m = {k: float(np.mean(v)) for k, v in (
+        ('x', x), ('y', y), ('xx', x * x), ('xy', x * y), ('yy', y * y))}
+
+    def loss_fn(W, b):
+        # mean((x W + b - y) ** 2)
+        return (W * W * m['xx'] + 2.0 * W * b * m['x'] + b * b -
+                2.0 * W * m['xy'] - 2.0 * b * m['y'] + m['yy'])
+
+    A = np.array([[m['xx'], m['x']], [m['x'], 1.0]])
+    W, b = np.linalg.solve(A, [m['xy'], m['y']])
+    best = float(loss_fn(Variable(np.array(W)), Variable(np.array(b))).data)
+    return loss_fn, (0.0, 0.0), best + 1e-6
+
+
+def rosenbrock():
+    def loss_fn(x0, x1):
+        return 100 * (x1 - x0 ** 2) ** 2 + (1 - x0) ** 2
+    return loss_fn, (0.0, 2.0), 1e-6
+
+
+def run_sgd(loss_fn, start, target, lr, max_iter):
+    params = [Variable(np.array(v)) for v in start]
+    optimizer = SGD(lr).setup(params)
+    begin = time.perf_counter()
+    for i in range(max_iter):
+        for p in params:
+            p.cleargrad()
+        loss = loss_fn(*params)
+        if float(loss.data) <= target:
+            return time.perf_counter() - begin, i
+        loss.backward()
+        optimizer.update()
+    return None, max_iter
+
+
+def run_lbfgs(loss_fn, start, target, max_iter):
+    params = [Variable(np.array(v)) for v in start]
+    optimizer = LBFGS(max_iter=1).setup(params)
+
+    def closure():
+        for p in params:
+            p.cleargrad()
+        loss = loss_fn(*params)
+        loss.backward()
+        return loss
+
+    begin = time.perf_counter()
+    for i in range(max_iter):
+        if float(closure().data) <= target:
+            return time.perf_counter() - begin, i
+        optimizer.update(closure)
+    return None, max_iter
+
+
+def main():
+    print('{:<12} {:<6} {:>10} {:>10}'.format(
+        'problem', 'opt', 'iters', 'ms'))
+    for name, problem, lr in (('regression', regression, 0.1),
+                              ('rosenbrock', rosenbrock, 0.001)):
+        loss_fn, start, target = problem()
+        for opt, (t, iters) in (
+                ('sgd', run_sgd(loss_fn, start, target, lr, 100000)),
+                ('lbfgs', run_lbfgs(loss_fn, start, target, 1000))):
+            ms = 'not reached' if t is None else '{:.1f}'.format(t * 1e3)
+            print('{:<12} {:<6} {:>10} {:>10}'.format(name, opt, iters, ms))
+
+
+if __name__ == '__main__':
+    main()
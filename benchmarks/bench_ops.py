@@ -0,0 +1,58 @@
+# ns per call for every overloaded operator on 0-d float64 Variables, with
+# the graph recorded, under no_grad() and under inference_mode(). Each
+# figure is the best of several timeit repeats, since single runs of
+# sub-microsecond ops move by 20% or more with machine noise.
+#
+#   python benchmarks/bench_ops.py [number] [repeat]
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import contextlib
+import sys
+import timeit
+import numpy as np
+from dezero import Variable, no_grad, inference_mode
+
+OPS = [
+    ('x + y', lambda x, y: x + y),
+    ('x + 2.0', lambda x, y: x + 2.0),
+    ('2.0 + x', lambda x, y: 2.0 + x),
+    ('x * y', lambda x, y: x * y),
+    ('x * 2.0', lambda x, y: x * 2.0),
+    ('2.0 * x', lambda x, y: 2.0 * x),
+    ('-x', lambda x, y: -x),
+    ('x - y', lambda x, y: x - y),
+    ('x - 2.0', lambda x, y: x - 2.0),
+    ('2.0 - x', lambda x, y: 2.0 - x),
+    ('x / y', lambda x, y: x / y),
+    ('x / 2.0', lambda x, y: x / 2.0),
+    ('2.0 / x', lambda x, y: 2.0 / x),
+    ('x ** 3', lambda x, y: x ** 3),
+]
+
+MODES = [('graph', contextlib.nullcontext), ('no_grad', no_grad),
+         ('inference', inference_mode)]
+
+
+def time_op(op, mode, number, repeat):
+    x = Variable(np.array(2.0))
+    y = Variable(np.array(3.0))
+    with mode():
+        times = timeit.repeat(lambda: op(x, y), number=number,
+                              repeat=repeat)
+    return min(times) / number * 1e9
+
+
+def main(number, repeat):
+    print('{:<10}'.format('op') +
+          ''.join('{:>12}'.format(name) for name, _ in MODES) + '  (ns/op)')
+    for label, op in OPS:
+        row = [time_op(op, mode, number, repeat) for _, mode in MODES]
+        print('{:<10}'.format(label) +
+              ''.join('{:>12.0f}'.format(t) for t in row))
+
+
+if __name__ == '__main__':
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+    main(number, repeat)
@@ -0,0 +1,58 @@
+# Serial against thread-pool backward on a wide graph of large arrays:
+# width independent chains over the same inputs, so up to width backward
+# functions are ready at once. NumPy releases the GIL in its loops, so the
+# speedup depends on the number of cores (os.cpu_count() is printed).
+#
+#   python benchmarks/bench_parallel_backward.py [width] [size]
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import os
+import sys
+import time
+import numpy as np
+from dezero import Variable
+
+
+def fan_out(x, w, width, depth=8):
+    total = None
+    for i in range(width):
+        h = x * (i + 1.0) + w
+        for _ in range(depth):
+            h = h * w - h / (i + 2.0)
+        total = h if total is None else total + h
+    return total
+
+
+def run(width, size, workers, repeat=3):
+    np.random.seed(0)
+    x = Variable(np.random.rand(size))
+    w = Variable(np.random.rand(size))
+    best = float('inf')
+    for _ in range(repeat):
+        x.cleargrad()
+        w.cleargrad()
+        y = fan_out(x, w, width)
+        start = time.perf_counter()
+        y.backward(workers=workers)
+        best = min(best, time.perf_counter() - start)
+    return best, x.grad
+
+
+def main(width, size):
+    print('cpus: {}, width {}, {} elements'.format(os.cpu_count(), width,
+                                                    size))
+    print('{:<8} {:>10} {:>10}'.format('workers', 'ms', 'speedup'))
+    serial, expected = run(width, size, None)
+    print('{:<8} {:>10.1f} {:>10.2f}'.format('serial', serial * 1e3, 1.0))
+    for workers in (1, 2, 4, 8):
+        t, gx = run(width, size, workers)
+        np.testing.assert_allclose(gx, expected, rtol=1e-12)
+        print('{:<8} {:>10.1f} {:>10.2f}'.format(workers, t * 1e3,
+                                                 serial / t))
+
+
+if __name__ == '__main__':
+    width = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 10 ** 6
+    main(width, size)
@@ -0,0 +1,85 @@
+# Memory held by graph nodes: the slotted Variable/Function layout against
+# the same classes with a per-instance __dict__ (a subclass without
+# __slots__ gets one back). First the step17 big-data loop, where the
+# arrays dominate, then long chains of scalar nodes, where the node objects
+# themselves are most of the graph.
+#
+#   python benchmarks/bench_slots_memory.py [nodes]
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import sys
+import tracemalloc
+import weakref
+import numpy as np
+from dezero import Variable, Function
+
+
+class DictVariable(Variable):
+    pass
+
+
+class SlotSquare(Function):
+    __slots__ = ()
+
+    def forward(self, x):
+        return x ** 2
+
+    def backward(self, gy):
+        return 2 * self.inputs[0].data * gy
+
+
+class DictSquare(SlotSquare):
+    pass
+
+
+def measure(fn, *args):
+    tracemalloc.start()
+    keep = fn(*args)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del keep
+    return current, peak
+
+
+def big_data_loop():
+    # steps/step17.py: y = square(square(square(x))) on 10^4 elements
+    for i in range(10):
+        x = Variable(np.random.randn(10000))
+        y = SlotSquare()(SlotSquare()(SlotSquare()(x)))
+    return y
+
+
+def scalar_chain(n, variable, function):
+    # the links an op writes, made by hand so that both layouts are built
+    # by the same code and only the node classes differ
+    data = np.array(1.0)
+    x = variable(data)
+    nodes = [x]
+    for _ in range(n):
+        f = function()
+        y = variable(data)
+        f.inputs = (x,)
+        f.outputs = (weakref.ref(y),)
+        f.generation = x.generation
+        y.set_creator(f)
+        nodes.append(y)
+        x = y
+    return nodes
+
+
+def main(n):
+    current, peak = measure(big_data_loop)
+    print('step17 loop: {:.0f} KiB held, {:.0f} KiB peak'.format(
+        current / 1024, peak / 1024))
+    print('{:<8} {:>10} {:>12} {:>12}'.format(
+        'layout', 'nodes', 'held MiB', 'bytes/node'))
+    for name, variable, function in (('slots', Variable, SlotSquare),
+                                     ('dict', DictVariable, DictSquare)):
+        current, _ = measure(scalar_chain, n, variable, function)
+        print('{:<8} {:>10} {:>12.1f} {:>12.0f}'.format(
+            name, n, current / 2**20, current / n))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 5)
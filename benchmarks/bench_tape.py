@@ -0,0 +1,54 @@
+# Tape walk against the graph walk on an elementwise training loop in the
+# style of step46: the same forward, then backward either through the heap
+# scheduler (creator links, weakrefs) or by replaying the tape in reverse.
+#
+#   python benchmarks/bench_tape.py [iters]
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import sys
+import time
+import numpy as np
+from dezero import Variable, using_tape
+
+
+def loss_fn(x, t, W, b):
+    y = x * W + b
+    y = y * y * 0.5 + y  # a few elementwise layers
+    d = y - t
+    return d * d
+
+
+def run(iters, tape):
+    np.random.seed(0)
+    x = np.random.rand(100)
+    t = 2 * x + 5
+    W = Variable(np.zeros(100))
+    b = Variable(np.zeros(100))
+    start = time.perf_counter()
+    for _ in range(iters):
+        W.cleargrad()
+        b.cleargrad()
+        if tape:
+            with using_tape() as rec:
+                loss = loss_fn(x, t, W, b)
+            rec.backward(loss)
+        else:
+            loss = loss_fn(x, t, W, b)
+            loss.backward()
+        W.data -= 0.01 * W.grad
+        b.data -= 0.01 * b.grad
+    return time.perf_counter() - start, W.data.copy()
+
+
+def main(iters):
+    graph, W0 = run(iters, tape=False)
+    tape, W1 = run(iters, tape=True)
+    assert np.allclose(W0, W1)
+    print('{:<8} {:>10} {:>12}'.format('walk', 'total s', 'us/iter'))
+    for name, t in (('graph', graph), ('tape', tape)):
+        print('{:<8} {:>10.3f} {:>12.1f}'.format(name, t, t / iters * 1e6))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,82 @@
+# Eager against traced execution: 1000 gradient descent steps on
+# rosenbrock (steps/step28.py), where every op works on scalars and the
+# Python overhead of building the graph is the whole cost, then an
+# elementwise training loop in the style of step46 on larger arrays.
+#
+#   python benchmarks/bench_trace.py [iters]
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import sys
+import time
+import numpy as np
+from dezero import Variable, trace
+
+
+def rosenbrock(x0, x1):
+    return 100 * (x1 - x0 ** 2) ** 2 + (1 - x0) ** 2
+
+
+def run_rosenbrock(iters, traced):
+    x0 = Variable(np.array(0.0))
+    x1 = Variable(np.array(2.0))
+    f = trace(lambda: rosenbrock(x0, x1)) if traced else \
+        (lambda: rosenbrock(x0, x1))
+    lr = 0.001
+    start = time.perf_counter()
+    for i in range(iters):
+        y = f()
+        x0.cleargrad()
+        x1.cleargrad()
+        y.backward()
+        x0.data -= lr * x0.grad
+        x1.data -= lr * x1.grad
+    return time.perf_counter() - start, (x0.data.copy(), x1.data.copy())
+
+
+def run_elementwise(iters, traced, size=1000):
+    np.random.seed(0)
+    x = Variable(np.random.rand(size))
+    t = Variable(2 * x.data + 5)
+    W = Variable(np.zeros(size))
+    b = Variable(np.zeros(size))
+
+    def loss_fn(x, t):
+        y = x * W + b
+        y = y * y * 0.5 + y
+        d = y - t
+        return d * d
+
+    f = trace(loss_fn) if traced else loss_fn
+    start = time.perf_counter()
+    for i in range(iters):
+        W.cleargrad()
+        b.cleargrad()
+        loss = f(x, t)
+        loss.backward()
+        W.data -= 0.01 * W.grad
+        b.data -= 0.01 * b.grad
+    return time.perf_counter() - start, W.data.copy()
+
+
+def main(iters, repeat=5):
+    print('{:<14} {:<8} {:>10} {:>12}'.format(
+        'problem', 'mode', 'total s', 'us/iter'))
+    for name, run in (('rosenbrock', run_rosenbrock),
+                      ('elementwise', run_elementwise)):
+        # alternate and keep the best of a few runs, so that warm-up and
+        # noise do not favour whichever goes first
+        eager = traced = float('inf')
+        for _ in range(repeat):
+            t, r0 = run(iters, False)
+            eager = min(eager, t)
+            t, r1 = run(iters, True)
+            traced = min(traced, t)
+            np.testing.assert_allclose(r0, r1)
+        for mode, t in (('eager', eager), ('traced', traced)):
+            print('{:<14} {:<8} {:>10.3f} {:>12.1f}'.format(
+                name, mode, t, t / iters * 1e6))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,30 @@
+from dezero.core import Variable
+from dezero.core import Function
+from dezero.core import Config
+from dezero.core import using_config
+from dezero.core import no_grad
+from dezero.core import test_mode
+from dezero.core import inference_mode
+from dezero.core import using_dtype
+from dezero.core import set_default_dtype
+from dezero.core import using_tape
+from dezero.core import using_cse
+from dezero.core import using_pool
+from dezero.core import MemoryPool
+from dezero.core import as_array
+from dezero.core import as_variable
+from dezero.core import setup_variable
+
+from dezero.transforms import checkpoint
+from dezero.transforms import trace
+from dezero.transforms import jvp
+from dezero.transforms import taylor
+from dezero.transforms import jacobian
+from dezero.transforms import hessian
+from dezero.transforms import hvp
+from dezero.transforms import vmap
+
+import dezero.optimizers
+import dezero.profiler
+
+setup_variable()
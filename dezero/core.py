@@ -0,0 +1,1175 @@
+import weakref
+import heapq
+import functools
+import contextlib
+import contextvars
+import sys
+import threading
+import concurrent.futures
+import numpy as np
+
+
+class Setting:
+    # a Config entry held in a ContextVar, so using_config in one thread or
+    # asyncio task is not seen by the others; reads stay Config.name
+    def __init__(self, default):
+        self.default = default
+
+    def __set_name__(self, owner, name):
+        self.var = contextvars.ContextVar(name)
+
+    def __get__(self, obj, objtype=None):
+        # the default is read late, so it can be changed process-wide
+        return self.var.get(self.default)
+
+
+class ConfigMeta(type):
+    # Config.name = value, as in the book, sets the value for the current
+    # context instead of replacing the Setting by a plain class attribute
+    def __setattr__(cls, name, value):
+        setting(name).var.set(value)
+
+
+class Config(metaclass=ConfigMeta):
+    enable_backprop = Setting(True)
+    train = Setting(True)
+    tape = Setting(None)
+    cse = Setting(None)
+    forward_mode = Setting(None)
+    inference = Setting(False)
+    dtype = Setting(None)  # floating dtype policy, None keeps the data's
+    pool = Setting(None)
+    profiler = Setting(None)
+
+
+# Function.__call__ checks for a profiler on every call; the bare ContextVar
+# is several times cheaper to read than the Config descriptor
+profiler_var = vars(Config)['profiler'].var
+
+
+setting_lock = threading.Lock()
+
+
+def setting(name):
+    # the Setting behind Config.name; a name Config does not know yet, as
+    # in using_config('my_flag', True), gets one that defaults to None
+    value = vars(Config).get(name)
+    if isinstance(value, Setting):
+        return value
+    if value is not None or name.startswith('_'):
+        raise AttributeError('{!r} is not a Config setting'.format(name))
+    with setting_lock:
+        value = vars(Config).get(name)
+        if not isinstance(value, Setting):
+            value = Setting(None)
+            value.__set_name__(Config, name)
+            type.__setattr__(Config, name, value)
+    return value
+
+
+def settings():
+    return {name: getattr(Config, name)
+            for name, value in vars(Config).items()
+            if isinstance(value, Setting)}
+
+
+@contextlib.contextmanager
+def using_config(name, value):
+    var = setting(name).var
+    token = var.set(value)
+    try:
+        yield
+    finally:
+        var.reset(token)
+
+
+def no_grad():
+    return using_config('enable_backprop', False)
+
+
+def test_mode():
+    return using_config('train', False)
+
+
+def using_dtype(dtype):
+    return using_config('dtype', None if dtype is None else np.dtype(dtype))
+
+
+def set_default_dtype(dtype):
+    # for every thread and context that has not entered using_dtype
+    vars(Config)['dtype'].default = None if dtype is None else np.dtype(dtype)
+
+
+@contextlib.contextmanager
+def inference_mode():
+    # stronger than no_grad: ops call forward on the raw arrays and wrap the
+    # results, skipping as_variable, the cse cache, forward mode and all graph
+    # bookkeeping, so nothing computed in here can ever take part in backward
+    with using_config('enable_backprop', False), \
+            using_config('inference', True):
+        yield
+
+
+grad_hooks = weakref.WeakKeyDictionary()  # leaf variable -> [hook]
+
+
+class Variable:
+    __slots__ = ('data', 'name', 'grad', 'grad_buf', 'creator', 'generation',
+                 'requires_grad', '__weakref__')
+    __array_priority__ = 200
+
+    def __init__(self, data, name=None, requires_grad=True):
+        if data is not None:
+            if not isinstance(data, np.ndarray):
+                raise TypeError('{} is not supported'.format(type(data)))
+            dtype = Config.dtype
+            if (dtype is not None and data.dtype.kind == 'f' and
+                    data.dtype != dtype):
+                data = data.astype(dtype)
+
+        self.data = data
+        self.name = name
+        self.requires_grad = requires_grad
+        self.grad = None
+        self.grad_buf = None  # accumulation buffer, see add_grad
+        self.creator = None
+        self.generation = 0
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @property
+    def ndim(self):
+        return self.data.ndim
+
+    @property
+    def size(self):
+        return self.data.size
+
+    @property
+    def dtype(self):
+        return self.data.dtype
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        if self.data is None:
+            return 'variable(None)'
+        p = str(self.data).replace('\n', '\n' + ' ' * 9)
+        return 'variable(' + p + ')'
+
+    def set_creator(self, func):
+        self.creator = func
+        self.generation = func.generation + 1
+
+    def cleargrad(self):
+        self.grad = None
+
+    def register_hook(self, hook):
+        # hook(self) runs during backward as soon as the gradient of this
+        # leaf is final, i.e. every function using it has run its backward
+        grad_hooks.setdefault(self, []).append(hook)
+        return hook
+
+    def add_grad(self, gx):
+        # Aliasing rule: self.grad may be the very array another variable
+        # (or the caller) holds, so it is never written to. Sums go into
+        # grad_buf, and only while nothing but this variable refers to it;
+        # once the buffer has been handed on (to an input's grad, a list of
+        # saved gradients, ...) a fresh one is taken instead.
+        if self.grad is None:
+            self.grad = gx
+            return
+        if isinstance(gx, Variable) or isinstance(self.grad, Variable):
+            self.grad = self.grad + gx  # create_graph, keep it differentiable
+            return
+        shape = np.broadcast(self.grad, gx).shape
+        dtype = np.result_type(self.grad, gx)
+        buf = self.grad_buf
+        # the slot, the local name, the argument, and self.grad if it is buf
+        owned = 4 if self.grad is buf else 3
+        if (buf is None or buf.shape != shape or buf.dtype != dtype or
+                sys.getrefcount(buf) > owned):
+            # not from the pool: a view of a pooled view points past it to
+            # the pool's bytes, where the count above could not see it
+            buf = np.empty(shape, dtype=dtype)
+            self.grad_buf = buf
+        np.add(self.grad, gx, out=buf)
+        self.grad = buf
+
+    def backward(self, retain_grad=False, retain_graph=False,
+                 create_graph=False, workers=None):
+        if self.creator is None:
+            # ops recorded inside using_tape() link no creators
+            raise RuntimeError(
+                'backward() needs a variable computed by recorded ops; for '
+                'an output recorded inside using_tape() call '
+                'tape.backward(y) instead')
+        if self.grad is None:
+            self.grad = np.ones_like(self.data)
+        if workers is not None:
+            if create_graph:
+                raise ValueError('create_graph is not supported with workers')
+            return parallel_backward(self, workers, retain_grad, retain_graph)
+        if create_graph and not isinstance(self.grad, Variable):
+            self.grad = Variable(self.grad, requires_grad=False)
+
+        funcs = []
+        seen_set = set()
+        counts = count_hooked(self.creator) if grad_hooks else None
+
+        def add_func(f):
+            if f not in seen_set:
+                # max-heap on generation; among equal generations the latest
+                # added comes out first, as the old stable sort + pop did.
+                # The outputs are held here until f runs, since the inputs
+                # of already processed functions may be released.
+                outputs = [output() for output in f.outputs]  # weakref
+                heapq.heappush(funcs, (-f.generation, -len(seen_set), f,
+                                       outputs))
+                seen_set.add(f)
+
+        add_func(self.creator)
+
+        profiler = Config.profiler
+
+        # with create_graph the gradients are Variables and the backward
+        # computation itself is recorded, which allows higher derivatives
+        with using_config('enable_backprop', create_graph):
+            while funcs:
+                f, outputs = heapq.heappop(funcs)[2:]
+                inputs = graph_inputs(f)
+                # an output nobody kept is dead and gets no gradient
+                gys = [None if output is None else output.grad
+                       for output in outputs]
+                if profiler is None:
+                    gxs = f.backward(*gys)
+                else:
+                    gxs = profiler.backward(f, gys)
+                if not isinstance(gxs, tuple):
+                    gxs = (gxs,)
+
+                for x, gx in zip(inputs, gxs):
+                    if not x.requires_grad:
+                        continue
+                    x.add_grad(gx)
+
+                    if x.creator is not None:
+                        add_func(x.creator)
+                    elif counts and x in counts:
+                        counts[x] -= 1
+                        if not counts[x]:
+                            run_hooks(x)
+
+                if not retain_grad:
+                    for output in outputs:
+                        if output is not None:
+                            output.grad = None
+                            output.grad_buf = None
+
+                # a recorded gradient graph may lead back into this one
+                if not retain_graph and not create_graph:
+                    f.inputs = None  # release the input data as soon as possible
+
+
+def parallel_backward(y, workers, retain_grad=False, retain_graph=False):
+    # a function is ready once every consumer of its outputs has run, and
+    # ready functions go to a thread pool; numpy drops the GIL in its loops,
+    # so independent branches of a wide graph really overlap. Gradients are
+    # not added as they arrive but summed in a fixed (consumer, slot) order
+    # right before use, so the result does not depend on thread timing.
+    order = {}  # function -> discovery index
+    outputs_of = {}
+    pending = {}  # id(variable) -> consumers that have not run yet
+    parts = {}  # id(variable) -> [(key, gx)]
+    stack = [y.creator]
+    order[y.creator] = 0
+    while stack:
+        f = stack.pop()
+        outputs_of[f] = [output() for output in f.outputs]  # weakref
+        for x in graph_inputs(f):
+            if not x.requires_grad:
+                continue
+            pending[id(x)] = pending.get(id(x), 0) + 1
+            if x.creator is not None and x.creator not in order:
+                order[x.creator] = len(order)
+                stack.append(x.creator)
+
+    profiler = Config.profiler
+    waiting = {}  # function -> outputs still waiting for gradients
+    for f, outputs in outputs_of.items():
+        waiting[f] = sum(1 for output in outputs
+                         if output is not None and pending.get(id(output)))
+
+    def collect(x):
+        for _, gx in sorted(parts.pop(id(x), ()), key=lambda p: p[0]):
+            x.add_grad(gx)
+
+    def run(f):
+        outputs = outputs_of[f]
+        for output in outputs:
+            if output is not None:
+                collect(output)
+        gys = [None if output is None else output.grad for output in outputs]
+        if profiler is None:
+            return f.backward(*gys)
+        return profiler.backward(f, gys)
+
+    with using_config('enable_backprop', False), \
+            concurrent.futures.ThreadPoolExecutor(workers) as pool:
+        # pool threads start from an empty context, so each task carries
+        # a copy of the current one (and with it enable_backprop=False)
+        def submit(f):
+            return pool.submit(contextvars.copy_context().run, run, f)
+
+        running = {submit(y.creator): y.creator}
+        while running:
+            done, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in sorted(done, key=lambda fu: order[running[fu]]):
+                f = running.pop(future)
+                gxs = future.result()
+                if not isinstance(gxs, tuple):
+                    gxs = (gxs,)
+
+                for i, (x, gx) in enumerate(zip(f.inputs, gxs)):
+                    if not x.requires_grad:
+                        continue
+                    parts.setdefault(id(x), []).append(((order[f], i), gx))
+                    pending[id(x)] -= 1
+                    if pending[id(x)]:
+                        continue
+                    if x.creator is None:
+                        collect(x)  # a leaf, nothing else will read it
+                        if x in grad_hooks:
+                            run_hooks(x)
+                        continue
+                    waiting[x.creator] -= 1
+                    if not waiting[x.creator]:
+                        running[submit(x.creator)] = x.creator
+
+                if not retain_grad:
+                    for output in outputs_of[f]:
+                        if output is not None:
+                            output.grad = None
+                            output.grad_buf = None
+
+                if not retain_graph:
+                    f.inputs = None  # release the input data as soon as possible
+
+
+def graph_inputs(f):
+    inputs = f.inputs
+    if inputs is None:
+        raise RuntimeError(
+            'the graph was already released by an earlier backward; pass '
+            'retain_graph=True to that call to run backward through it again')
+    return inputs
+
+
+def count_hooked(f):
+    # how many gradients each hooked leaf above f is going to receive
+    counts = {}
+    seen = {f}
+    stack = [f]
+    while stack:
+        f = stack.pop()
+        for x in graph_inputs(f):
+            if not x.requires_grad:
+                continue
+            if x.creator is None:
+                if x in grad_hooks:
+                    counts[x] = counts.get(x, 0) + 1
+            elif x.creator not in seen:
+                seen.add(x.creator)
+                stack.append(x.creator)
+    return counts
+
+
+def run_hooks(x):
+    for hook in grad_hooks[x]:
+        hook(x)
+
+
+def backward_inputs(f, gy):
+    # a Variable gy means backward runs with create_graph, so the formula
+    # has to be built from the input Variables instead of their data
+    if isinstance(gy, Variable):
+        return f.inputs
+    return [x.data for x in f.inputs]
+
+
+def as_variable(obj):
+    if isinstance(obj, Variable):
+        return obj
+    return Variable(obj, requires_grad=False)  # plain arrays are data
+
+
+def as_array(x):
+    if isinstance(x, np.ndarray):
+        return x  # np.isscalar is slow on arrays, and arrays are the rule
+    if np.isscalar(x):
+        return np.array(x)
+    return x
+
+
+def new_variable(data, requires_grad):
+    # Variable() without the argument check, for arrays produced by ops
+    v = Variable.__new__(Variable)
+    v.data = data
+    v.name = None
+    v.requires_grad = requires_grad
+    v.grad = None
+    v.grad_buf = None
+    v.creator = None
+    v.generation = 0
+    return v
+
+
+@functools.lru_cache(maxsize=256, typed=True)
+def scalar_const(c, dtype=None):
+    c = np.array(c, dtype=dtype)
+    c.flags.writeable = False  # shared between all ops using the constant
+    return c
+
+
+def as_const(c, dtype=None):
+    # a 0-d array is not a weak scalar to numpy, so a Python number has to
+    # take the floating dtype of the other operand (dtype) or float32 data
+    # would come out as float64; a dtype policy casts every floating const.
+    # Without a policy a NumPy scalar keeps its dtype, np.float64(2) then
+    # upcasts float32 data: NumPy itself treats its scalars as typed
+    # values (NEP 50), and we do not second-guess an explicit dtype
+    policy = Config.dtype
+    target = policy
+    if target is None and dtype is not None and dtype.kind == 'f':
+        target = dtype
+    if np.isscalar(c):
+        if target is not None and (type(c) in (int, float) or (
+                policy is not None and isinstance(c, np.floating))):
+            return scalar_const(c, target)
+        return scalar_const(c)
+    if (policy is not None and isinstance(c, np.ndarray) and
+            c.dtype.kind == 'f' and c.dtype != policy):
+        return c.astype(policy)
+    return c
+
+
+class Function:
+    # subclasses without __slots__ still get a __dict__ for their own state
+    __slots__ = ('inputs', 'outputs', 'generation')
+    shared = None  # instance reused by calls that record no graph node
+
+    def __call__(self, *inputs):
+        profiler = profiler_var.get(None)
+        if profiler is not None and profiler.entered() is not self:
+            return profiler.call(self, inputs)
+
+        # each Config read is a ContextVar lookup, so read them once
+        enable_backprop = Config.enable_backprop
+        if not enable_backprop and Config.inference:
+            ys = self.forward(*[x.data if isinstance(x, Variable) else x
+                                for x in inputs])
+            if isinstance(ys, tuple):
+                return [new_variable(as_array(y), False) for y in ys]
+            return new_variable(as_array(ys), False)
+
+        cache = Config.cse
+        forward_mode = Config.forward_mode
+        if (cache is None and forward_mode is None and len(inputs) <= 2 and
+                (not enable_backprop or Config.tape is None)):
+            # the common case of plain one or two input ops, without lists
+            if len(inputs) == 2:
+                x0, x1 = inputs
+                if not isinstance(x0, Variable):
+                    x0 = as_variable(x0)
+                if not isinstance(x1, Variable):
+                    x1 = as_variable(x1)
+                y = self.forward(x0.data, x1.data)
+                requires_grad = enable_backprop and (x0.requires_grad or
+                                                     x1.requires_grad)
+                inputs = (x0, x1)
+            else:
+                x0, = inputs
+                if not isinstance(x0, Variable):
+                    x0 = as_variable(x0)
+                y = self.forward(x0.data)
+                requires_grad = enable_backprop and x0.requires_grad
+                inputs = (x0,)
+            if not isinstance(y, tuple):
+                output = new_variable(as_array(y), requires_grad)
+                if requires_grad:
+                    f = self if self is not self.shared else type(self)()
+                    f.generation = max([x.generation for x in inputs])
+                    output.creator = f
+                    output.generation = f.generation + 1
+                    f.inputs = inputs
+                    f.outputs = (weakref.ref(output),)
+                return output
+            outputs = self.record(inputs, y, requires_grad)
+            return outputs if len(outputs) > 1 else outputs[0]
+
+        if self is self.shared:
+            self = type(self)()  # cse and forward mode keep the node
+        inputs = [as_variable(x) for x in inputs]
+        if cache is not None:
+            key, held = cse_key(self, inputs)
+            if key is not None:
+                snapshot = cse_snapshot(held)
+            hit = cache.get(key) if key is not None else None
+            if hit is not None:
+                outputs = [ref() for ref in hit[0]]
+                # the earlier node must not be released by a backward pass
+                f = outputs[0].creator if None not in outputs else None
+                if None not in outputs and (f is None or
+                                            f.inputs is not None) and \
+                        hit[2] == snapshot:
+                    return outputs if len(outputs) > 1 else outputs[0]
+
+        xs = [x.data for x in inputs]
+        ys = self.forward(*xs)
+        requires_grad = enable_backprop and any(
+            x.requires_grad for x in inputs)
+        outputs = self.record(inputs, ys, requires_grad)
+
+        if cache is not None and key is not None:
+            # only weak references, so the cache keeps no data alive; the
+            # entry goes as soon as anything its key refers to by id dies,
+            # before that id can be reused
+            def drop(ref, key=key):
+                cache.pop(key, None)
+            cache[key] = ([weakref.ref(y, drop) for y in outputs],
+                          [weakref.ref(x, drop) for x in held],
+                          snapshot)
+
+        if forward_mode is not None:
+            forward_mode.propagate(self, inputs, outputs)
+
+        return outputs if len(outputs) > 1 else outputs[0]
+
+    def record(self, inputs, ys, requires_grad):
+        if not isinstance(ys, tuple):
+            ys = (ys,)
+        outputs = [new_variable(as_array(y), requires_grad) for y in ys]
+
+        if Config.enable_backprop:
+            # the tape keeps every op so that a traced plan can replay the
+            # data-only parts too; their outputs simply get no gradient
+            tape = Config.tape
+            if tape is not None:
+                self.inputs = inputs
+                tape.entries.append((self, outputs))
+            elif requires_grad:
+                f = self if self is not self.shared else type(self)()
+                f.generation = max([x.generation for x in inputs])
+                for output in outputs:
+                    output.set_creator(f)
+                f.inputs = inputs
+                f.outputs = [weakref.ref(output) for output in outputs]
+
+        return outputs
+
+    def forward(self, xs):
+        raise NotImplementedError()
+
+    def backward(self, gys):
+        raise NotImplementedError()
+
+    def jvp(self, txs):
+        raise NotImplementedError()
+
+    def taylor(self, sxs):
+        raise NotImplementedError()
+
+
+class Tangents:
+    def __init__(self):
+        self.values = {}  # id(variable) -> (variable, tangent)
+
+    def get(self, x):
+        entry = self.values.get(id(x))
+        return None if entry is None else entry[1]
+
+    def set(self, x, t):
+        self.values[id(x)] = (x, t)
+
+    def propagate(self, f, inputs, outputs):
+        txs = [self.get(x) for x in inputs]
+        if all(t is None for t in txs):
+            return
+        txs = [0 if t is None else t for t in txs]  # zero tangent
+
+        f.inputs = inputs  # jvp reads the input data like backward does
+        tys = f.jvp(*txs)
+        if not isinstance(tys, tuple):
+            tys = (tys,)
+        for y, ty in zip(outputs, tys):
+            self.set(y, ty)
+
+
+def series_mul(a, b):
+    # Cauchy product of two truncated series, O(K^2)
+    return [sum(a[j] * b[k - j] for j in range(k + 1)) for k in range(len(a))]
+
+
+class TaylorSeries(Tangents):
+    # higher-order forward mode: instead of one tangent each variable carries
+    # its truncated Taylor series [x0, x1, ..., xK] with x0 the value itself
+    def __init__(self, order):
+        super().__init__()
+        self.order = order
+
+    def propagate(self, f, inputs, outputs):
+        sxs = [self.get(x) for x in inputs]
+        if all(s is None for s in sxs):
+            return
+        sxs = [[x.data] + [0] * self.order if s is None else s
+               for x, s in zip(inputs, sxs)]  # constant series
+
+        f.inputs = inputs
+        series = f.taylor(*sxs)
+        if not isinstance(series, tuple):
+            series = (series,)
+        for y, sy in zip(outputs, series):
+            self.set(y, sy)
+
+
+class Tape:
+    def __init__(self):
+        self.entries = []  # (function, outputs) in creation order
+
+    def backward(self, y, retain_grad=False, retain_graph=False):
+        if y.grad is None:
+            y.grad = np.ones_like(y.data)
+
+        # creation order is a topological order, so walking it backwards
+        # needs no generation sort, seen set or weakref lookups
+        entries = self.entries if not retain_graph else list(self.entries)
+        counts = self.count_hooked(y) if grad_hooks else None
+        profiler = Config.profiler
+        while entries:
+            f, outputs = entries.pop()
+            gys = [output.grad for output in outputs]
+            if all(gy is None for gy in gys):
+                continue  # not an ancestor of y
+            if profiler is None:
+                gxs = f.backward(*gys)
+            else:
+                gxs = profiler.backward(f, gys)
+            if not isinstance(gxs, tuple):
+                gxs = (gxs,)
+
+            for x, gx in zip(f.inputs, gxs):
+                if x.requires_grad:
+                    x.add_grad(gx)
+                    if counts and x in counts:
+                        counts[x] -= 1
+                        if not counts[x]:
+                            run_hooks(x)
+
+            if not retain_grad:
+                for output in outputs:
+                    output.grad = None
+                    output.grad_buf = None
+
+            if not retain_graph:
+                f.inputs = None
+
+    def count_hooked(self, y):
+        # count_hooked over the recorded ops that lead to y
+        counts = {}
+        needed = {id(y)}
+        for f, outputs in reversed(self.entries):
+            if not any(id(output) in needed for output in outputs):
+                continue
+            for x in f.inputs:
+                if x.requires_grad:
+                    needed.add(id(x))
+                    if x in grad_hooks:
+                        counts[x] = counts.get(x, 0) + 1
+        return counts
+
+
+def cse_key(f, inputs):
+    params = []
+    for cls in type(f).__mro__:
+        if cls is Function:
+            break
+        params.extend(getattr(f, name, None)
+                      for name in cls.__dict__.get('__slots__', ()))
+    # constant arrays (cached scalars included) are compared by identity,
+    # like the inputs; held lists everything keyed by id
+    held = [p for p in params if isinstance(p, np.ndarray)] + list(inputs)
+    params = [('array', id(p)) if isinstance(p, np.ndarray) else p
+              for p in params]
+    if hasattr(f, '__dict__'):
+        params.extend(sorted(f.__dict__.items()))
+
+    key = (type(f), Config.enable_backprop, tuple(params),
+           tuple(id(x) for x in inputs))
+    try:
+        hash(key)
+    except TypeError:
+        return None, None  # e.g. array parameters, never shared
+    return key, held
+
+
+def cse_snapshot(held):
+    # the values an entry was computed from: an input is the same object
+    # after x.data[...] = v or an optimizer step, so its id says nothing
+    # about its data. Comparing bytes is linear in the size, as the op is
+    snapshot = []
+    for x in held:
+        data = x.data if isinstance(x, Variable) else x
+        if data.flags.writeable:  # not a shared constant
+            snapshot.append((data.shape, data.dtype, data.tobytes()))
+    return snapshot
+
+
+def using_cse():
+    return using_config('cse', {})
+
+
+@contextlib.contextmanager
+def using_tape():
+    tape = Tape()
+    with using_config('tape', tape):
+        yield tape
+
+
+class MemoryPool:
+    # recycles the large arrays that every iteration allocates again with
+    # the same sizes. Buffers are raw bytes in power-of-two buckets and are
+    # lent out as typed views; when a view dies (with its Variable) the
+    # buffer comes back. A view of the view still points at the buffer, so
+    # a buffer is only reused once nothing but the pool refers to it.
+    def __init__(self, min_bytes=1 << 16):
+        self.min_bytes = min_bytes
+        self.free = {}  # bucket size -> [buffer]
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_held = 0  # all buffers owned by the pool, free or lent
+
+    def empty(self, shape, dtype):
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        if nbytes < self.min_bytes:
+            return np.empty(shape, dtype=dtype)
+        size = 1 << (nbytes - 1).bit_length()
+
+        buf = None
+        with self.lock:
+            bufs = self.free.get(size, [])
+            for i in range(len(bufs) - 1, -1, -1):
+                # only the list entry and the argument itself
+                if sys.getrefcount(bufs[i]) <= 2:
+                    buf = bufs.pop(i)
+                    break
+            if buf is None:
+                self.misses += 1
+                self.bytes_held += size
+            else:
+                self.hits += 1
+        if buf is None:
+            buf = np.empty(size, dtype=np.uint8)
+
+        x = buf[:nbytes].view(dtype).reshape(shape)
+        weakref.finalize(x, self.release, size, buf)
+        return x
+
+    def release(self, size, buf):
+        with self.lock:
+            self.free.setdefault(size, []).append(buf)
+
+    def clear(self):
+        # drop the free buffers; lent ones come back later as usual
+        with self.lock:
+            for size, bufs in self.free.items():
+                self.bytes_held -= size * len(bufs)
+            self.free = {}
+
+    def stats(self):
+        bytes_free = sum(size * len(bufs) for size, bufs in self.free.items())
+        return {'hits': self.hits, 'misses': self.misses,
+                'bytes_held': self.bytes_held, 'bytes_free': bytes_free}
+
+
+@contextlib.contextmanager
+def using_pool(pool=None):
+    pool = MemoryPool() if pool is None else pool
+    with using_config('pool', pool):
+        yield pool
+
+
+def empty(shape, dtype):
+    pool = Config.pool
+    if pool is None:
+        return np.empty(shape, dtype=dtype)
+    return pool.empty(shape, dtype)
+
+
+def apply(ufunc, *args):
+    # ufunc(*args), writing into a pooled buffer when a pool is active.
+    # Under create_graph the backward formulas pass a Variable first, and
+    # that has to go through the graph-building op instead.
+    if isinstance(args[0], Variable):
+        return ufunc_ops[ufunc](*args)
+    pool = Config.pool
+    if pool is None or not all(type(a) is np.ndarray or type(a) in
+                               (int, float) for a in args):
+        return ufunc(*args)  # subclasses like TracedArray keep their type
+    dtypes = tuple(type(a) if type(a) in (int, float) else a.dtype
+                   for a in args)
+    dtype = ufunc.resolve_dtypes(dtypes + (None,))[-1]
+    shape = np.broadcast_shapes(*[np.shape(a) for a in args])
+    return ufunc(*args, out=pool.empty(shape, dtype))
+
+
+class Add(Function):
+    __slots__ = ()
+
+    def forward(self, x0, x1):
+        y = apply(np.add, x0, x1)
+        return y
+
+    def backward(self, gy):
+        return gy, gy
+
+    def jvp(self, t0, t1):
+        return t0 + t1
+
+    def taylor(self, s0, s1):
+        return [a + b for a, b in zip(s0, s1)]
+
+
+class AddConst(Function):
+    __slots__ = ('c',)
+
+    def __init__(self, c, dtype=None):
+        self.c = as_const(c, dtype)
+
+    def forward(self, x):
+        y = apply(np.add, x, self.c)
+        return y
+
+    def backward(self, gy):
+        return gy
+
+    def jvp(self, t):
+        return t
+
+    def taylor(self, s):
+        return [s[0] + self.c] + s[1:]
+
+
+def add(x0, x1):
+    if isinstance(x1, Variable):
+        return Add.shared(x0, x1)
+    return AddConst(x1, x0.dtype)(x0)
+
+
+class Mul(Function):
+    __slots__ = ()
+
+    def forward(self, x0, x1):
+        y = apply(np.multiply, x0, x1)
+        return y
+
+    def backward(self, gy):
+        x0, x1 = backward_inputs(self, gy)
+        gx0 = (apply(np.multiply, gy, x1) if self.inputs[0].requires_grad
+               else None)
+        gx1 = (apply(np.multiply, gy, x0) if self.inputs[1].requires_grad
+               else None)
+        return gx0, gx1
+
+    def jvp(self, t0, t1):
+        x0, x1 = self.inputs[0].data, self.inputs[1].data
+        return t0 * x1 + x0 * t1
+
+    def taylor(self, s0, s1):
+        return series_mul(s0, s1)
+
+
+class MulConst(Function):
+    __slots__ = ('c',)
+
+    def __init__(self, c, dtype=None):
+        self.c = as_const(c, dtype)
+
+    def forward(self, x):
+        y = apply(np.multiply, x, self.c)
+        return y
+
+    def backward(self, gy):
+        return apply(np.multiply, gy, self.c)
+
+    def jvp(self, t):
+        return t * self.c
+
+    def taylor(self, s):
+        return [a * self.c for a in s]
+
+
+def mul(x0, x1):
+    if isinstance(x1, Variable):
+        return Mul.shared(x0, x1)
+    return MulConst(x1, x0.dtype)(x0)
+
+
+class Neg(Function):
+    __slots__ = ()
+
+    def forward(self, x):
+        return apply(np.negative, x)
+
+    def backward(self, gy):
+        return apply(np.negative, gy)
+
+    def jvp(self, t):
+        return -t
+
+    def taylor(self, s):
+        return [-a for a in s]
+
+
+def neg(x):
+    return Neg.shared(x)
+
+
+class Sub(Function):
+    __slots__ = ()
+
+    def forward(self, x0, x1):
+        y = apply(np.subtract, x0, x1)
+        return y
+
+    def backward(self, gy):
+        return gy, (apply(np.negative, gy) if self.inputs[1].requires_grad
+                    else None)
+
+    def jvp(self, t0, t1):
+        return t0 - t1
+
+    def taylor(self, s0, s1):
+        return [a - b for a, b in zip(s0, s1)]
+
+
+class SubConst(Function):
+    __slots__ = ('c',)
+
+    def __init__(self, c, dtype=None):
+        self.c = as_const(c, dtype)
+
+    def forward(self, x):
+        y = apply(np.subtract, x, self.c)
+        return y
+
+    def backward(self, gy):
+        return gy
+
+    def jvp(self, t):
+        return t
+
+    def taylor(self, s):
+        return [s[0] - self.c] + s[1:]
+
+
+class RSubConst(Function):
+    __slots__ = ('c',)
+
+    def __init__(self, c, dtype=None):
+        self.c = as_const(c, dtype)
+
+    def forward(self, x):
+        y = apply(np.subtract, self.c, x)
+        return y
+
+    def backward(self, gy):
+        return apply(np.negative, gy)
+
+    def jvp(self, t):
+        return -t
+
+    def taylor(self, s):
+        return [self.c - s[0]] + [-a for a in s[1:]]
+
+
+def sub(x0, x1):
+    if isinstance(x1, Variable):
+        return Sub.shared(x0, x1)
+    return SubConst(x1, x0.dtype)(x0)
+
+
+def rsub(x0, x1):
+    if isinstance(x1, Variable):
+        return Sub.shared(x1, x0)
+    return RSubConst(x1, x0.dtype)(x0)
+
+
+class Div(Function):
+    __slots__ = ()
+
+    def forward(self, x0, x1):
+        y = apply(np.divide, x0, x1)
+        return y
+
+    def backward(self, gy):
+        x0, x1 = backward_inputs(self, gy)
+        gx0 = (apply(np.divide, gy, x1) if self.inputs[0].requires_grad
+               else None)
+        gx1 = (apply(np.multiply, gy, -x0 / x1 ** 2)
+               if self.inputs[1].requires_grad else None)
+        return gx0, gx1
+
+    def jvp(self, t0, t1):
+        x0, x1 = self.inputs[0].data, self.inputs[1].data
+        return t0 / x1 + t1 * (-x0 / x1 ** 2)
+
+    def taylor(self, s0, s1):
+        # solve s1 * y = s0 for y one coefficient at a time
+        ys = []
+        for k in range(len(s0)):
+            r = s0[k] - sum(s1[j] * ys[k - j] for j in range(1, k + 1))
+            ys.append(r / s1[0])
+        return ys
+
+
+class DivConst(Function):
+    __slots__ = ('c',)
+
+    def __init__(self, c, dtype=None):
+        self.c = as_const(c, dtype)
+
+    def forward(self, x):
+        y = apply(np.divide, x, self.c)
+        return y
+
+    def backward(self, gy):
+        return apply(np.divide, gy, self.c)
+
+    def jvp(self, t):
+        return t / self.c
+
+    def taylor(self, s):
+        return [a / self.c for a in s]
+
+
+class RDivConst(Function):
+    __slots__ = ('c',)
+
+    def __init__(self, c, dtype=None):
+        self.c = as_const(c, dtype)
+
+    def forward(self, x):
+        y = apply(np.divide, self.c, x)
+        return y
+
+    def backward(self, gy):
+        x, = backward_inputs(self, gy)
+        gx = apply(np.multiply, gy, -self.c / x ** 2)
+        return gx
+
+    def jvp(self, t):
+        x = self.inputs[0].data
+        return t * (-self.c / x ** 2)
+
+    def taylor(self, s):
+        ys = [self.c / s[0]]
+        for k in range(1, len(s)):
+            ys.append(-sum(s[j] * ys[k - j] for j in range(1, k + 1)) / s[0])
+        return ys
+
+
+def div(x0, x1):
+    if isinstance(x1, Variable):
+        return Div.shared(x0, x1)
+    return DivConst(x1, x0.dtype)(x0)
+
+
+def rdiv(x0, x1):
+    if isinstance(x1, Variable):
+        return Div.shared(x1, x0)
+    return RDivConst(x1, x0.dtype)(x0)
+
+
+class Pow(Function):
+    __slots__ = ('c',)
+
+    def __init__(self, c):
+        # a Python number stays as it is, weak to numpy; a typed floating
+        # exponent would upcast the data, so a dtype policy casts it
+        if Config.dtype is not None and (
+                isinstance(c, np.floating) or
+                isinstance(c, np.ndarray) and c.dtype.kind == 'f'):
+            c = as_const(c)
+        self.c = c
+
+    def forward(self, x):
+        y = apply(np.power, x, self.c)
+        return y
+
+    def backward(self, gy):
+        x, = backward_inputs(self, gy)
+        c = self.c
+
+        gx = apply(np.multiply, c * x ** (c - 1), gy)
+        return gx
+
+    def jvp(self, t):
+        x = self.inputs[0].data
+        c = self.c
+        return c * x ** (c - 1) * t
+
+    def taylor(self, s):
+        c = self.c
+        if np.ndim(c) == 0 and c >= 0 and float(c).is_integer():
+            # repeated squaring also works where x0 is zero; that covers
+            # 2.0 and np.int64(2) as much as 2
+            c = int(c)
+            ys, base = [1] + [0] * (len(s) - 1), s
+            while c:
+                if c & 1:
+                    ys = series_mul(ys, base)
+                c >>= 1
+                if c:
+                    base = series_mul(base, base)
+            return ys
+        # from x * y' = c * x' * y:
+        # k x0 yk = sum_{j=1..k} (c j - (k - j)) xj y(k-j)
+        ys = [s[0] ** c]
+        for k in range(1, len(s)):
+            r = sum((c * j - (k - j)) * s[j] * ys[k - j]
+                    for j in range(1, k + 1))
+            ys.append(r / (k * s[0]))
+        return ys
+
+
+def pow(x, c):
+    return Pow(c)(x)
+
+
+# the stateless ops share one instance each; __call__ makes a fresh one
+# whenever a graph node has to be recorded
+for cls in (Add, Mul, Neg, Sub, Div):
+    cls.shared = cls()
+
+# what apply falls back to when a backward formula is given Variables
+ufunc_ops = {np.add: add, np.subtract: sub, np.multiply: mul,
+             np.divide: div, np.negative: neg, np.power: pow}
+
+
+def setup_variable():
+    Variable.__add__ = add
+    Variable.__radd__ = add
+    Variable.__mul__ = mul
+    Variable.__rmul__ = mul
+    Variable.__neg__ = neg
+    Variable.__sub__ = sub
+    Variable.__rsub__ = rsub
+    Variable.__truediv__ = div
+    Variable.__rtruediv__ = rdiv
+    Variable.__pow__ = pow
@@ -0,0 +1,277 @@
+import collections
+import contextvars
+import numpy as np
+from dezero.core import Function, Variable, using_config
+
+
+class Optimizer:
+    def __init__(self):
+        self.target = None
+
+    def setup(self, target):
+        # a model with params(), or simply a sequence of Variables
+        self.target = target
+        return self
+
+    def params(self):
+        if hasattr(self.target, 'params'):
+            return list(self.target.params())
+        return list(self.target)
+
+    def update(self):
+        params = [p for p in self.params() if p.grad is not None]
+        for param in params:
+            self.update_one(param)
+
+    def update_one(self, param):
+        raise NotImplementedError()
+
+
+class SGD(Optimizer):
+    def __init__(self, lr=0.01, overlap=False, executor=None):
+        super().__init__()
+        self.lr = lr
+        # with overlap each parameter is updated from a gradient hook while
+        # backward is still running, optionally on an executor, and its
+        # gradient is dropped right after, so update() only has to wait
+        self.overlap = overlap
+        self.executor = executor
+        self.futures = []
+
+    def setup(self, target):
+        super().setup(target)
+        if self.overlap:
+            for param in self.params():
+                param.register_hook(self.on_grad)
+        return self
+
+    def on_grad(self, param):
+        if self.executor is None:
+            self.step(param)
+        else:
+            self.futures.append(self.executor.submit(
+                contextvars.copy_context().run, self.step, param))
+
+    def step(self, param):
+        self.update_one(param)
+        param.grad = None
+        param.grad_buf = None
+
+    def update(self):
+        if not self.overlap:
+            return super().update()
+        futures, self.futures = self.futures, []
+        for future in futures:
+            future.result()
+
+    def update_one(self, param):
+        param.data -= self.lr * param.grad
+
+
+def vdot(xs, ys):
+    return sum(np.vdot(x, y) for x, y in zip(xs, ys))
+
+
+class Seed(Function):
+    # joins several roots into one, so that a single backward pass starts
+    # from all of them with the given gradients
+    __slots__ = ('gys',)
+
+    def __init__(self, gys):
+        self.gys = gys
+
+    def forward(self, *xs):
+        return np.array(0.0)
+
+    def backward(self, gy):
+        return tuple(self.gys)
+
+
+class NewtonCG(Optimizer):
+    # truncated Newton: the Newton system H d = -g is solved approximately
+    # by conjugate gradients, where H only appears through Hessian-vector
+    # products from a second backward pass over the gradient graph
+    def __init__(self, lr=1.0, max_iter=10, tol=1e-5, damping=0.0):
+        super().__init__()
+        self.lr = lr
+        self.max_iter = max_iter
+        self.tol = tol
+        self.damping = damping
+
+    def update(self):
+        # needs the gradients of loss.backward(create_graph=True)
+        params = [p for p in self.params() if p.grad is not None]
+        gvs = [p.grad for p in params]
+        if not all(isinstance(gv, Variable) for gv in gvs):
+            raise ValueError('NewtonCG needs gradients from '
+                             'backward(create_graph=True)')
+        gs = [gv.data for gv in gvs]
+
+        # a gradient without a creator does not depend on the params
+        roots = [i for i, gv in enumerate(gvs) if gv.creator is not None]
+
+        def hvp(vs):
+            for p in params:
+                p.cleargrad()
+            if roots:
+                # one pass from all the gradients at once, seeded with v
+                with using_config('enable_backprop', True), \
+                        using_config('tape', None):
+                    y = Seed([vs[i] for i in roots])(*[gvs[i] for i in roots])
+                y.backward(retain_graph=True)
+            return [(0 if p.grad is None else p.grad) + self.damping * v
+                    for p, v in zip(params, vs)]
+
+        d = [np.zeros_like(g) for g in gs]
+        r = [-g for g in gs]
+        direction = r
+        rs = vdot(r, r)
+        tol = self.tol * np.sqrt(rs)
+        for i in range(self.max_iter):
+            hd = hvp(direction)
+            curvature = vdot(direction, hd)
+            if curvature <= 0:
+                if i == 0:
+                    d = direction  # no positive curvature, plain descent
+                break
+            alpha = rs / curvature
+            d = [di + alpha * pi for di, pi in zip(d, direction)]
+            r = [ri - alpha * hi for ri, hi in zip(r, hd)]
+            rs_new = vdot(r, r)
+            if np.sqrt(rs_new) <= tol:
+                break
+            direction = [ri + (rs_new / rs) * pi
+                         for ri, pi in zip(r, direction)]
+            rs = rs_new
+
+        for p, g, di in zip(params, gs, d):
+            p.data += self.lr * di
+            p.grad = g  # leave the first-order gradient, not the last hvp
+
+
+def cubic_min(t1, f1, g1, t2, f2, g2):
+    # minimizer of the cubic through (t1, f1, g1) and (t2, f2, g2), kept
+    # away from the ends of the bracket; bisection if there is none
+    lo, hi = min(t1, t2), max(t1, t2)
+    d1 = g1 + g2 - 3 * (f1 - f2) / (t1 - t2)
+    d2sq = d1 * d1 - g1 * g2
+    if d2sq >= 0:
+        d2 = np.sqrt(d2sq) * np.sign(t2 - t1)
+        t = t2 - (t2 - t1) * (g2 + d2 - d1) / (g2 - g1 + 2 * d2)
+        margin = 0.1 * (hi - lo)
+        if np.isfinite(t):
+            return min(max(t, lo + margin), hi - margin)
+    return (lo + hi) / 2
+
+
+class LBFGS(Optimizer):
+    # full-batch quasi-Newton; the parameters are handled as one flat vector
+    # and the curvature is kept as the last history_size (s, y) pairs
+    def __init__(self, lr=1.0, max_iter=20, history_size=10, tol=1e-7,
+                 c1=1e-4, c2=0.9, max_ls=25):
+        super().__init__()
+        self.lr = lr
+        self.max_iter = max_iter
+        self.tol = tol
+        self.c1 = c1
+        self.c2 = c2
+        self.max_ls = max_ls
+        self.history = collections.deque(maxlen=history_size)
+
+    def update(self, closure):
+        # closure clears the grads, computes the loss, calls backward and
+        # returns the loss; it is re-evaluated by the line search
+        params = self.params()
+
+        def evaluate(x):
+            offset = 0
+            for p in params:
+                # copied into the parameter's own array, in its own dtype
+                p.data[...] = x[offset:offset + p.size].reshape(p.shape)
+                offset += p.size
+            loss = closure()
+            g = np.concatenate([np.ravel(np.zeros_like(p.data)
+                                         if p.grad is None else p.grad)
+                                for p in params])
+            # backward seeds ones, so a non-scalar loss acts as its sum
+            return float(np.sum(loss.data)), g
+
+        x = np.concatenate([np.ravel(p.data) for p in params])
+        f, g = evaluate(x)
+        for i in range(self.max_iter):
+            if np.max(np.abs(g)) <= self.tol:
+                break
+            d = self.direction(g)
+            if np.dot(g, d) >= 0:
+                self.history.clear()  # not a descent direction, start over
+                d = -g
+            if self.history:
+                t = self.lr
+            else:
+                t = self.lr * min(1.0, 1.0 / np.sum(np.abs(g)))
+            t, f_new, g_new = self.line_search(evaluate, x, f, g, d, t)
+            s, y = t * d, g_new - g
+            ys = np.dot(y, s)
+            if ys > 1e-10:
+                self.history.append((s, y, 1.0 / ys))
+            x = x + s
+            done = abs(f_new - f) <= self.tol * max(1.0, abs(f))
+            f, g = f_new, g_new
+            if done:
+                break
+
+        # the last trial of the line search need not be the accepted point
+        f, g = evaluate(x)
+        return f
+
+    def direction(self, g):
+        # two-loop recursion for -H g with the inverse Hessian approximation
+        q = -g
+        alphas = []
+        for s, y, rho in reversed(self.history):
+            alpha = rho * np.dot(s, q)
+            q = q - alpha * y
+            alphas.append(alpha)
+        if self.history:
+            s, y, _ = self.history[-1]
+            q = q * (np.dot(s, y) / np.dot(y, y))
+        for (s, y, rho), alpha in zip(self.history, reversed(alphas)):
+            beta = rho * np.dot(y, q)
+            q = q + (alpha - beta) * s
+        return q
+
+    def line_search(self, evaluate, x, f, g, d, t):
+        # strong Wolfe conditions, Nocedal & Wright algorithms 3.5 and 3.6
+        gtd = np.dot(g, d)
+        prev = (0.0, f, g, gtd)
+        for i in range(self.max_ls):
+            f_new, g_new = evaluate(x + t * d)
+            gtd_new = np.dot(g_new, d)
+            cur = (t, f_new, g_new, gtd_new)
+            if f_new > f + self.c1 * t * gtd or (i > 0 and f_new >= prev[1]):
+                return self.zoom(evaluate, x, f, gtd, d, prev, cur)
+            if abs(gtd_new) <= -self.c2 * gtd:
+                return t, f_new, g_new
+            if gtd_new >= 0:
+                return self.zoom(evaluate, x, f, gtd, d, cur, prev)
+            prev = cur
+            t = 2 * t
+        return prev[:3]
+
+    def zoom(self, evaluate, x, f, gtd, d, lo, hi):
+        for _ in range(self.max_ls):
+            t = cubic_min(lo[0], lo[1], lo[3], hi[0], hi[1], hi[3])
+            f_new, g_new = evaluate(x + t * d)
+            gtd_new = np.dot(g_new, d)
+            cur = (t, f_new, g_new, gtd_new)
+            if f_new > f + self.c1 * t * gtd or f_new >= lo[1]:
+                hi = cur
+            else:
+                if abs(gtd_new) <= -self.c2 * gtd:
+                    return t, f_new, g_new
+                if gtd_new * (hi[0] - lo[0]) >= 0:
+                    hi = lo
+                lo = cur
+            if abs(hi[0] - lo[0]) * np.max(np.abs(d)) <= 1e-12:
+                break
+        return lo[:3]
@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import threading
+import contextlib
+import tracemalloc
+import numpy as np
+from dezero.core import Variable, using_config
+
+
+def describe(xs):
+    xs = [x.data if isinstance(x, Variable) else x for x in xs]
+    arrays = [x for x in xs if isinstance(x, np.ndarray)]
+    return ([list(x.shape) for x in arrays], [x.dtype.name for x in arrays],
+            sum(x.nbytes for x in arrays))
+
+
+class Profiler:
+    # records a complete event for every Function call (forward plus the
+    # graph bookkeeping) and every Function.backward run by the backward
+    # walkers. Events nest, e.g. a traced Replay's backward contains the
+    # backward of each op in its plan, so each event also gets its self
+    # time, the duration minus that of the events inside it; self times
+    # add up, durations do not. output_bytes is the size of the arrays an
+    # op returns; allocated_bytes is the most the event had allocated at
+    # any one time, temporaries included, over what was live when it
+    # started (tracemalloc; None with memory=False). tracemalloc is
+    # process-wide, so events overlapping in other threads (backward with
+    # workers) blur each other's figures.
+    def __init__(self, memory=True):
+        self.events = []
+        self.local = threading.local()
+        self.origin = time.perf_counter_ns()
+        self.memory = memory
+
+    def entered(self):
+        return getattr(self.local, 'entered', None)
+
+    def enter(self):
+        # one entry per open event in this thread: time of the events
+        # nested in it so far, traced memory at its start and the highest
+        # traced memory seen before the last reset of the peak
+        stack = self.local.__dict__.setdefault('stack', [])
+        if self.memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if stack and stack[-1][1] is not None:
+                stack[-1][2] = max(stack[-1][2], peak)
+            tracemalloc.reset_peak()
+            stack.append([0, current, current])
+        else:
+            stack.append([0, None, None])
+
+    def leave(self, duration):
+        stack = self.local.stack
+        nested, start, high = stack.pop()
+        allocated = None
+        if start is not None and tracemalloc.is_tracing():
+            high = max(high, tracemalloc.get_traced_memory()[1])
+            allocated = high - start
+            if stack and stack[-1][1] is not None:
+                stack[-1][2] = max(stack[-1][2], high)
+            tracemalloc.reset_peak()
+        if stack:
+            stack[-1][0] += duration
+        return duration - nested, allocated
+
+    def call(self, f, inputs):
+        outer = self.entered()
+        self.local.entered = f  # so that f's own __call__ runs normally
+        self.enter()
+        start = time.perf_counter_ns()
+        try:
+            outputs = f(*inputs)
+        finally:
+            end = time.perf_counter_ns()
+            own, allocated = self.leave(end - start)
+            self.local.entered = outer
+        ys = outputs if isinstance(outputs, list) else [outputs]
+        self.add(f, 'forward', start, end, own, allocated, inputs, ys)
+        return outputs
+
+    def backward(self, f, gys):
+        self.enter()
+        start = time.perf_counter_ns()
+        try:
+            gxs = f.backward(*gys)
+        finally:
+            end = time.perf_counter_ns()
+            own, allocated = self.leave(end - start)
+        self.add(f, 'backward', start, end, own, allocated, gys,
+                 gxs if isinstance(gxs, tuple) else (gxs,))
+        return gxs
+
+    def add(self, f, phase, start, end, own, allocated, xs, ys):
+        in_shapes, in_dtypes, _ = describe(xs)
+        out_shapes, out_dtypes, nbytes = describe(ys)
+        self.events.append({
+            'name': type(f).__name__, 'phase': phase,
+            'start': start - self.origin, 'duration': end - start,
+            'self': own, 'thread': threading.get_ident(),
+            'input_shapes': in_shapes, 'input_dtypes': in_dtypes,
+            'output_shapes': out_shapes, 'output_dtypes': out_dtypes,
+            'output_bytes': nbytes, 'allocated_bytes': allocated})
+
+    def summary(self):
+        # (op class, phase) -> count, total, self and mean ns, output and
+        # allocated bytes
+        table = {}
+        for e in self.events:
+            row = table.setdefault((e['name'], e['phase']),
+                                   {'count': 0, 'total': 0, 'self': 0,
+                                    'output_bytes': 0, 'allocated_bytes': 0})
+            row['count'] += 1
+            row['total'] += e['duration']
+            row['self'] += e['self']
+            row['output_bytes'] += e['output_bytes']
+            row['allocated_bytes'] += e['allocated_bytes'] or 0
+        for row in table.values():
+            row['mean'] = row['total'] / row['count']
+        return table
+
+    def print_table(self, top=10, sort_by='self'):
+        rows = sorted(self.summary().items(), key=lambda kv: -kv[1][sort_by])
+        print('{:<16} {:<9} {:>8} {:>12} {:>12} {:>12} {:>12} {:>12}'.format(
+            'op', 'phase', 'count', 'total ms', 'self ms', 'mean us',
+            'out MB', 'alloc MB'))
+        for (name, phase), row in rows[:top]:
+            print('{:<16} {:<9} {:>8} {:>12.3f} {:>12.3f} {:>12.3f} '
+                  '{:>12.3f} {:>12.3f}'.format(
+                      name, phase, row['count'], row['total'] / 1e6,
+                      row['self'] / 1e6, row['mean'] / 1e3,
+                      row['output_bytes'] / 2 ** 20,
+                      row['allocated_bytes'] / 2 ** 20))
+
+    def export_chrome_trace(self, path):
+        # complete ('X') events in microseconds, for chrome://tracing and
+        # Perfetto
+        events = [{
+            'name': e['name'], 'cat': e['phase'], 'ph': 'X',
+            'ts': e['start'] / 1e3, 'dur': e['duration'] / 1e3,
+            'pid': os.getpid(), 'tid': e['thread'],
+            'args': {k: e[k] for k in ('self', 'input_shapes', 'input_dtypes',
+                                       'output_shapes', 'output_dtypes',
+                                       'output_bytes', 'allocated_bytes')}}
+            for e in self.events]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events}, f)
+
+
+@contextlib.contextmanager
+def profile(memory=True):
+    # memory traces allocations with tracemalloc, started here unless it
+    # already runs; that slows allocation down, so memory=False gives
+    # cleaner timings
+    profiler = Profiler(memory)
+    started = memory and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        with using_config('profiler', profiler):
+            yield profiler
+    finally:
+        if started:
+            tracemalloc.stop()
@@ -0,0 +1,797 @@
+import sys
+import weakref
+import contextlib
+import contextvars
+import numpy as np
+from dezero.core import (Config, Function, Variable, Tangents, TaylorSeries,
+                         Add, AddConst, Mul, MulConst, Neg, Sub, SubConst,
+                         RSubConst, Div, DivConst, RDivConst, Pow, as_array,
+                         as_variable, empty, no_grad, settings, using_config,
+                         using_tape)
+
+
+class Leaves:
+    # stands in for a tape when only the variables a computation reads are
+    # wanted: the ops are not kept, just what they read that none of them
+    # (nor the given inputs) produced
+    def __init__(self, inputs):
+        self.entries = self  # Function.record appends to tape.entries
+        self.produced = {id(x) for x in inputs}
+        self.leaves = []
+
+    def append(self, entry):
+        f, outputs = entry
+        for x in f.inputs:
+            if id(x) not in self.produced:
+                self.produced.add(id(x))
+                self.leaves.append(x)
+        self.produced.update(id(y) for y in outputs)
+
+
+def substitute(entries, variables):
+    # point recorded ops at stand-ins for the given variables, so that a
+    # backward over the entries leaves the gradients on the stand-ins
+    proxies = {id(x): Variable(x.data, requires_grad=x.requires_grad)
+               for x in variables}
+    for f, _ in entries:
+        f.inputs = [proxies.get(id(x), x) for x in f.inputs]
+    return [proxies[id(x)] for x in variables]
+
+
+class Checkpoint(Function):
+    __slots__ = ('f', 'n', 'y', 'config', 'rng_state')
+
+    def __init__(self, f, n, y=None):
+        self.f = f
+        self.n = n  # inputs of f; the closure variables it reads follow
+        self.y = y  # result of the forward checkpoint() already ran
+
+    def forward(self, *xs):
+        y, self.y = self.y, None
+        if y is None:  # e.g. replayed by a traced plan
+            # keep only the segment inputs; the inner graph is rebuilt in
+            # backward
+            self.config = settings()
+            self.rng_state = np.random.get_state()
+            with no_grad():
+                y = self.f(*[Variable(x) for x in xs[:self.n]]).data
+        return y
+
+    def backward(self, gy):
+        n = self.n
+        xs = [Variable(x.data, requires_grad=x.requires_grad)
+              for x in self.inputs[:n]]
+
+        # recompute under the forward-time config and random state so that
+        # things like dropout masks come out the same
+        rng_state = np.random.get_state()
+        np.random.set_state(self.rng_state)
+        try:
+            with contextlib.ExitStack() as stack:
+                for name, value in self.config.items():
+                    stack.enter_context(using_config(name, value))
+                stack.enter_context(using_config('enable_backprop', True))
+                tape = stack.enter_context(using_tape())
+                y = self.f(*xs)
+        finally:
+            np.random.set_state(rng_state)
+
+        # the closure variables get their gradients through this node, not
+        # from the inner backward
+        params = substitute(tape.entries, self.inputs[n:])
+        y.grad = gy
+        with no_grad():
+            tape.backward(y)
+        gxs = tuple(x.grad for x in xs) + tuple(
+            np.zeros_like(p.data) if p.grad is None else p.grad
+            for p in params)
+        return gxs if len(gxs) > 1 else gxs[0]
+
+
+def checkpoint(f, *inputs):
+    inputs = [as_variable(x) for x in inputs]
+    config = settings()
+    rng_state = np.random.get_state()
+    if not config['enable_backprop']:
+        with no_grad():
+            return f(*inputs)
+
+    # the forward runs here, noting which closure variables (weights and
+    # the like) f reads; those that need a gradient become inputs of the
+    # node as well, so the outer graph sees them
+    xs = [Variable(x.data) for x in inputs]
+    leaves = Leaves(xs)
+    with using_config('tape', leaves):
+        y = f(*xs)
+    params = [x for x in leaves.leaves if x.requires_grad]
+
+    node = Checkpoint(f, len(inputs), y.data)
+    node.config = config
+    node.rng_state = rng_state
+    return node(*inputs, *params)
+
+
+tracing = contextvars.ContextVar('tracing', default=None)  # Plan being built
+
+
+def touch():
+    plan = tracing.get()
+    if plan is not None:
+        plan.touched = True
+
+
+class TracedArray(np.ndarray):
+    # data seen while tracing; flags values that reach Python control flow
+    # in the plan being built, since a replay could not follow such a branch
+
+    def __bool__(self):
+        touch()
+        return super().__bool__()
+
+    def __float__(self):
+        touch()
+        return super().__float__()
+
+    def __int__(self):
+        touch()
+        return super().__int__()
+
+    def __index__(self):
+        touch()
+        return super().__index__()
+
+    def item(self, *args):
+        touch()
+        return super().item(*args)
+
+    def tolist(self):
+        touch()
+        return super().tolist()
+
+    def __getitem__(self, key):
+        # indexing down to one element gives a plain NumPy scalar, which
+        # would carry the value past the checks above unnoticed
+        y = super().__getitem__(key)
+        if not isinstance(y, np.ndarray):
+            touch()
+        return y
+
+    def __iter__(self):
+        if self.ndim == 1:
+            touch()  # yields NumPy scalars, as indexing does
+        return super().__iter__()
+
+
+class Fused(Function):
+    __slots__ = ('program', 'exposed', 'specs', 'released', 'saved', 'vals')
+
+    def __init__(self, program, exposed, specs, released, saved):
+        self.program = program  # (op class, ufunc, arg slots, out slot, c)
+        self.exposed = exposed  # slots handed out as outputs
+        self.specs = specs  # (shape, dtype) of every slot
+        self.released = released  # per op, slots that die after it
+        self.saved = saved  # slots the backward pass reads
+        self.vals = None  # between forward and backward only
+
+    def forward(self, *xs):
+        # an op output that is neither handed out nor read by backward is
+        # dropped after its last use, and its buffer serves a later op
+        specs, exposed = self.specs, self.exposed
+        vals = list(xs) + [None] * len(self.program)
+        spare = {}
+        for (kind, ufunc, args, out, c), released in zip(self.program,
+                                                         self.released):
+            buf = None
+            if out not in exposed and spare.get(specs[out]):
+                buf = spare[specs[out]].pop()
+            if buf is None:
+                buf = empty(*specs[out])
+            if kind in (RSubConst, RDivConst):
+                ufunc(c, vals[args[0]], out=buf)
+            elif c is not None:
+                ufunc(vals[args[0]], c, out=buf)
+            else:
+                ufunc(*[vals[i] for i in args], out=buf)
+            vals[out] = buf
+            for i in released:
+                spare.setdefault(specs[i], []).append(vals[i])
+                vals[i] = None
+        ys = tuple(vals[i] for i in exposed)
+        self.vals = [v if i in self.saved else None
+                     for i, v in enumerate(vals)]
+        return ys if len(ys) > 1 else ys[0]
+
+    def backward(self, *gys):
+        # gradients are made as needed and dropped once their op is done,
+        # as the eager graph does; grads[i] may be an array someone else
+        # holds (an incoming gy, or a gradient passed through unchanged)
+        # and is only written to once owned[i] says it is ours
+        vals, specs = self.vals, self.specs
+        grads = [None] * len(vals)
+        owned = [False] * len(vals)
+        tmps = {}
+
+        def scratch(i):
+            tmp = tmps.pop(specs[i], None)
+            return empty(*specs[i]) if tmp is None else tmp
+
+        def acc(i, t, ufunc=np.add, own=False):
+            g = grads[i]
+            if g is None:
+                if ufunc is np.subtract:
+                    t = np.negative(t, out=t if own else scratch(i))
+                    own = True
+                grads[i], owned[i] = t, own
+                return
+            if owned[i]:
+                ufunc(g, t, out=g)
+            else:
+                grads[i] = ufunc(g, t, out=scratch(i))
+                owned[i] = True
+            if own:
+                tmps[specs[i]] = t
+
+        for i, gy in zip(self.exposed, gys):
+            if gy is not None:
+                acc(i, gy)
+
+        for kind, ufunc, args, out, c in reversed(self.program):
+            g, own = grads[out], owned[out]
+            grads[out] = vals[out] = None
+            if g is None:
+                continue
+            a = args[0]
+            if kind is Add:
+                for i in args:
+                    acc(i, g)
+                continue
+            elif kind in (AddConst, SubConst):
+                acc(a, g, own=own)
+                continue
+            elif kind in (Neg, RSubConst):
+                acc(a, g, np.subtract, own=own)
+                continue
+            elif kind is Sub:
+                acc(a, g)
+                acc(args[1], g, np.subtract)
+                continue
+            elif kind in (MulConst, DivConst):
+                acc(a, ufunc(g, c, out=scratch(a)), own=True)
+            elif kind is RDivConst:
+                tmp = np.power(vals[a], 2, out=scratch(a))
+                np.divide(-c, tmp, out=tmp)
+                np.multiply(g, tmp, out=tmp)
+                acc(a, tmp, own=True)
+            elif kind is Mul:
+                b = args[1]
+                acc(a, np.multiply(g, vals[b], out=scratch(a)), own=True)
+                acc(b, np.multiply(g, vals[a], out=scratch(b)), own=True)
+            elif kind is Div:
+                b = args[1]
+                acc(a, np.divide(g, vals[b], out=scratch(a)), own=True)
+                tmp = np.power(vals[b], 2, out=scratch(b))
+                np.divide(vals[a], tmp, out=tmp)
+                np.multiply(g, tmp, out=tmp)
+                acc(b, tmp, np.subtract, own=True)
+            elif kind is Pow:
+                tmp = np.power(vals[a], c - 1, out=scratch(a))
+                np.multiply(c, tmp, out=tmp)
+                np.multiply(tmp, g, out=tmp)
+                acc(a, tmp, own=True)
+            if own:
+                tmps[specs[out]] = g  # only read above, so it is scratch
+
+        self.vals = None
+        n = len(vals) - len(self.program)
+        gxs = tuple(np.zeros(*specs[i]) if grads[i] is None else grads[i]
+                    for i in range(n))
+        return gxs if len(gxs) > 1 else gxs[0]
+
+
+fusible_ops = {Add: np.add, Sub: np.subtract, Mul: np.multiply,
+               Div: np.divide, Neg: np.negative, Pow: np.power,
+               AddConst: np.add, SubConst: np.subtract,
+               RSubConst: np.subtract, MulConst: np.multiply,
+               DivConst: np.divide, RDivConst: np.divide}
+
+
+def fuse(entries, outputs):
+    def fusible(f, ys):
+        if type(f) not in fusible_ops or len(ys) != 1:
+            return False
+        y = ys[0].data
+        return y.dtype.kind == 'f' and all(
+            x.data.shape == y.shape and x.data.dtype == y.dtype
+            for x in f.inputs)
+
+    runs, run = [], []
+    for i, (f, ys) in enumerate(entries):
+        if fusible(f, ys):
+            run.append(i)
+            continue
+        runs.append(run)
+        runs.append([i])
+        run = []
+    runs.append(run)
+
+    consumers = {}
+    for i, (f, _) in enumerate(entries):
+        for x in f.inputs:
+            consumers.setdefault(id(x), set()).add(i)
+    output_ids = {id(y) for y in outputs}
+
+    fused = []
+    for run in runs:
+        if len(run) < 2:
+            fused.extend(entries[i] for i in run)
+            continue
+
+        # external inputs take the first slots, then one slot per op output
+        inner = set(run)
+        produced = {id(entries[i][1][0]) for i in run}
+        slots, inputs, specs = {}, [], []
+        for i in run:
+            for x in entries[i][0].inputs:
+                if id(x) not in slots and id(x) not in produced:
+                    slots[id(x)] = len(inputs)
+                    inputs.append(x)
+                    specs.append((x.data.shape, x.data.dtype))
+        program, exposed, exposed_vars = [], [], []
+        for i in run:
+            f, (y,) = entries[i]
+            out = len(specs)
+            specs.append((y.data.shape, y.data.dtype))
+            program.append((type(f), fusible_ops[type(f)],
+                            tuple(slots[id(x)] for x in f.inputs), out,
+                            getattr(f, 'c', None)))
+            slots[id(y)] = out
+            if id(y) in output_ids or not consumers.get(id(y), set()) <= inner:
+                exposed.append(out)
+                exposed_vars.append(y)
+
+        # liveness: backward reads the operands of these ops again, the
+        # other op outputs die with their last use in the forward sweep
+        saved = set()
+        last_use = {}
+        for k, (kind, _, args, out, _) in enumerate(program):
+            if kind in (Mul, Div, Pow, RDivConst):
+                saved.update(args)
+            for a in args:
+                last_use[a] = k
+        released = [[] for _ in program]
+        for k, (_, _, _, out, _) in enumerate(program):
+            if out not in saved and out not in exposed:
+                released[last_use.get(out, k)].append(out)
+
+        f = Fused(program, exposed, specs, released, saved)
+        f.inputs = inputs
+        fused.append((f, exposed_vars))
+    return fused
+
+
+class MemoryPlan:
+    # static buffer assignment for a traced plan. The first forward+backward
+    # replay records every allocation and when it died; then allocations
+    # that never live at the same time share a slot (greedy best fit) and
+    # later replays get views of the slots in the same order. Whatever is
+    # still alive after backward (outputs, gradients) was handed out and
+    # stays a fresh array.
+    def __init__(self, min_bytes=1 << 16):
+        self.min_bytes = min_bytes
+        self.recording = None  # [(shape, dtype, nbytes, [start, end])]
+        self.clock = 0
+        self.allocs = None  # [(shape, dtype, slot or None)] once planned
+        self.slots = []
+        self.index = 0
+        self.naive_bytes = 0
+        self.live_bytes = 0
+        self.planned_bytes = 0
+        self.fallbacks = 0
+
+    def start(self):
+        # at the beginning of each forward replay
+        self.index = 0
+        if self.allocs is None:
+            self.recording = []
+
+    def empty(self, shape, dtype):
+        shape = tuple(shape)
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        if nbytes < self.min_bytes:
+            return np.empty(shape, dtype=dtype)
+
+        if self.allocs is None:
+            x = np.empty(shape, dtype=dtype)
+            if self.recording is not None:
+                interval = [self.clock, None]
+                self.clock += 1
+                self.recording.append((shape, dtype, nbytes, interval))
+                weakref.finalize(x, self.died, interval)
+            return x
+
+        i = self.index
+        self.index += 1
+        if i < len(self.allocs):
+            planned_shape, planned_dtype, slot = self.allocs[i]
+            if slot is None and (planned_shape, planned_dtype) == (shape,
+                                                                   dtype):
+                return np.empty(shape, dtype=dtype)
+            # the slot must match and its last user must really be gone:
+            # only the slot list and the argument refer to it
+            if (slot is not None and planned_shape == shape and
+                    planned_dtype == dtype and
+                    sys.getrefcount(self.slots[slot]) <= 2):
+                return self.slots[slot][:nbytes].view(dtype).reshape(shape)
+        self.fallbacks += 1
+        return np.empty(shape, dtype=dtype)
+
+    def died(self, interval):
+        interval[1] = self.clock
+        self.clock += 1
+
+    def finish(self):
+        # after the first backward replay: turn the recording into slots
+        if self.allocs is not None or self.recording is None:
+            return
+        events = []
+        for i, (_, _, _, (start, end)) in enumerate(self.recording):
+            if end is not None:
+                events.append((start, i))
+                events.append((end, i))
+        events.sort()
+
+        sizes, free, slot_of = [], [], {}
+        live = peak = 0
+        for _, i in events:
+            nbytes = self.recording[i][2]
+            if i in slot_of:
+                free.append(slot_of[i])
+                live -= nbytes
+                continue
+            live += nbytes
+            peak = max(peak, live)
+            fits = [s for s in free if sizes[s] >= nbytes]
+            if fits:
+                slot = min(fits, key=sizes.__getitem__)
+            elif free:
+                slot = max(free, key=sizes.__getitem__)  # grow the largest
+                sizes[slot] = nbytes
+            else:
+                slot = len(sizes)
+                sizes.append(nbytes)
+                free.append(slot)
+            free.remove(slot)
+            slot_of[i] = slot
+
+        self.allocs = [(shape, dtype, slot_of.get(i))
+                       for i, (shape, dtype, _, _) in enumerate(self.recording)]
+        self.slots = [np.empty(size, dtype=np.uint8) for size in sizes]
+        self.naive_bytes = sum(nbytes for _, _, nbytes, _ in self.recording)
+        self.live_bytes = peak
+        self.planned_bytes = sum(sizes)
+        self.recording = None
+
+    def report(self):
+        # naive: every allocation separate; live: the most bytes alive at
+        # once, a lower bound for any plan; planned: the slots allocated
+        return {'naive': self.naive_bytes, 'live': self.live_bytes,
+                'planned': self.planned_bytes, 'fallbacks': self.fallbacks}
+
+
+class Plan:
+    def __init__(self, f, inputs, fuse_ops=False, plan_memory=False):
+        self.inputs = [Variable(x.data.view(TracedArray),
+                                requires_grad=x.requires_grad)
+                       for x in inputs]
+        self.owner = None
+        self.memory = MemoryPlan() if plan_memory else None
+        self.touched = False
+
+        token = tracing.set(self)
+        try:
+            rng_state = np.random.get_state()
+            self.record(f)
+            params = [x for x in self.leaves()
+                      if not isinstance(x.data, TracedArray)]
+            if params:
+                # a branch on a closure variable (if w.data > 0: ...) is
+                # control flow as well, so record once more with those
+                # viewed as traced data and the same random draws
+                saved = [x.data for x in params]
+                for x in params:
+                    x.data = x.data.view(TracedArray)
+                np.random.set_state(rng_state)
+                try:
+                    self.record(f)
+                finally:
+                    for x, data in zip(params, saved):
+                        x.data = data
+        finally:
+            tracing.reset(token)
+
+        # a leaf built from traced data outside of any Function would be
+        # frozen into the plan as a constant
+        consts = [getattr(f, 'c', None) for f, _ in self.entries]
+        self.dynamic = self.touched or any(
+            isinstance(x.data, TracedArray) for x in self.leaves()) or any(
+            isinstance(c, TracedArray) for c in consts)
+
+        # closure variables that need a gradient are passed to the replay
+        # as extra inputs, so its node reaches them; the plan reads them
+        # through stand-ins like its other inputs
+        self.params = [x for x in self.leaves() if x.requires_grad]
+        self.inputs += substitute(self.entries, self.params)
+        if fuse_ops and not self.dynamic:
+            self.entries = fuse(self.entries, self.outputs)
+
+    def record(self, f):
+        with using_config('enable_backprop', True), using_tape() as tape:
+            outputs = f(*self.inputs)
+        if not isinstance(outputs, tuple):
+            outputs = (outputs,)
+        self.outputs = list(outputs)
+        self.entries = tape.entries
+
+    def leaves(self):
+        # variables the recorded ops read that neither the plan inputs nor
+        # another recorded op provide, each once
+        produced = {id(y) for _, ys in self.entries for y in ys}
+        produced.update(id(x) for x in self.inputs)
+        leaves = []
+        for f, _ in self.entries:
+            for x in f.inputs:
+                if id(x) not in produced:
+                    produced.add(id(x))
+                    leaves.append(x)
+        return leaves
+
+    def forward(self, *xs):
+        for x, data in zip(self.inputs, xs):
+            x.data = data
+
+        for f, outputs in self.entries:
+            ys = f.forward(*[x.data for x in f.inputs])
+            if not isinstance(ys, tuple):
+                ys = (ys,)
+            for output, y in zip(outputs, ys):
+                output.data = as_array(y)
+
+        ys = tuple(y.data for y in self.outputs)
+        return ys if len(ys) > 1 else ys[0]
+
+    def backward(self, *gys):
+        for y, gy in zip(self.outputs, gys):
+            y.grad = gy
+
+        profiler = Config.profiler
+        for f, outputs in reversed(self.entries):
+            gys = [output.grad for output in outputs]
+            if all(gy is None for gy in gys):
+                continue
+            if profiler is None:
+                gxs = f.backward(*gys)
+            else:
+                gxs = profiler.backward(f, gys)
+            if not isinstance(gxs, tuple):
+                gxs = (gxs,)
+
+            for x, gx in zip(f.inputs, gxs):
+                if x.requires_grad:
+                    x.add_grad(gx)
+
+            # the plan's variables outlive this call; dropping their
+            # buffers keeps gradients handed out from being overwritten
+            # by the next replay, and their data is not needed any more
+            for output in outputs:
+                output.data = None
+                output.grad = None
+                output.grad_buf = None
+        self.owner = None
+
+        gxs = []
+        for x in self.inputs:
+            if not x.requires_grad:
+                gxs.append(None)
+            elif x.grad is None:
+                gxs.append(np.zeros_like(x.data))
+            else:
+                gxs.append(x.grad)
+            x.data = None
+            x.grad = None
+            x.grad_buf = None
+        return tuple(gxs) if len(gxs) > 1 else gxs[0]
+
+
+class Replay(Function):
+    __slots__ = ('plan',)
+
+    def __init__(self, plan):
+        self.plan = plan
+
+    def forward(self, *xs):
+        plan = self.plan
+        plan.owner = self
+        if plan.memory is None:
+            return plan.forward(*xs)
+        plan.memory.start()
+        with using_config('pool', plan.memory):
+            return plan.forward(*xs)
+
+    def backward(self, *gys):
+        # plans are replayed on arrays, so create_graph stops here
+        gys = [gy.data if isinstance(gy, Variable) else gy for gy in gys]
+        plan = self.plan
+        if plan.owner is not self:
+            # the plan has been replayed on other data since our forward
+            self.forward(*[x.data for x in self.inputs])
+        if plan.memory is None:
+            return plan.backward(*gys)
+        with using_config('pool', plan.memory):
+            gxs = plan.backward(*gys)
+        plan.memory.finish()
+        return gxs
+
+
+class Trace:
+    def __init__(self, f, fuse=False, plan_memory=False):
+        self.f = f
+        self.fuse = fuse
+        self.plan_memory = plan_memory
+        self.plans = {}
+
+    def __call__(self, *inputs):
+        inputs = [as_variable(x) for x in inputs]
+        key = tuple((x.shape, x.dtype, x.requires_grad) for x in inputs)
+        plan = self.plans.get(key)
+        if plan is None:
+            plan = Plan(self.f, inputs, self.fuse, self.plan_memory)
+            self.plans[key] = plan
+
+        if plan.dynamic:
+            return self.f(*inputs)
+        return Replay(plan)(*inputs, *plan.params)
+
+
+def trace(f, fuse=False, plan_memory=False):
+    return Trace(f, fuse, plan_memory)
+
+
+def jvp(f, primals, tangents):
+    # forward mode: tangents ride along with a single forward pass and no
+    # backward graph is recorded
+    xs = [as_variable(x) for x in primals]
+    mode = Tangents()
+    for x, t in zip(xs, tangents):
+        mode.set(x, np.asarray(t))
+
+    with no_grad(), using_config('forward_mode', mode):
+        ys = f(*xs)
+
+    if not isinstance(ys, tuple):
+        ys = (ys,)
+    tys = []
+    for y in ys:
+        ty = mode.get(y)
+        tys.append(np.zeros_like(y.data) if ty is None else ty)
+    if len(ys) == 1:
+        return ys[0], tys[0]
+    return ys, tuple(tys)
+
+
+def taylor(f, x, order, direction=None):
+    # the first order derivatives of f along direction (ones by default),
+    # all from one forward sweep of truncated Taylor series; this replaces
+    # repeated backward(create_graph=True), whose graphs grow with the order
+    x = as_variable(x)
+    mode = TaylorSeries(order)
+    v = np.ones_like(x.data) if direction is None else np.asarray(direction)
+    mode.set(x, [x.data, v] + [0] * (order - 1))
+
+    with no_grad(), using_config('forward_mode', mode):
+        y = f(x)
+
+    sy = mode.get(y)
+    if sy is None:
+        sy = [y.data] + [0] * order
+    # coefficient k is the k-th derivative divided by k!
+    derivs, fact = [], 1
+    for k, a in enumerate(sy):
+        fact *= max(k, 1)
+        derivs.append(np.broadcast_to(a * fact, y.shape).copy())
+    return derivs
+
+
+def batch_sum_to(g, shape):
+    # g holds one gradient per seed along axis 0, broadcast to a larger
+    # shape than the variable's; sum the broadcast axes back out
+    g = np.asarray(g)
+    lead = g.ndim - 1 - len(shape)
+    axis = tuple(range(1, 1 + lead)) + tuple(
+        1 + lead + i for i, sx in enumerate(shape)
+        if sx == 1 and g.shape[1 + lead + i] != 1)
+    if axis:
+        g = g.sum(axis=axis, keepdims=True)
+    return g.reshape(g.shape[:1] + tuple(shape))
+
+
+def seeds(shape, dtype):
+    n = int(np.prod(shape))
+    return np.eye(n, dtype=dtype).reshape((n,) + tuple(shape))
+
+
+# All ops in this core are elementwise with NumPy broadcasting, so a stack
+# of seed vectors along a new leading axis goes through one backward pass.
+
+def jacobian(f, *xs):
+    xs = [Variable(x.data if isinstance(x, Variable) else np.asarray(x))
+          for x in xs]
+    y = f(*xs)
+    y.grad = seeds(y.shape, y.dtype)
+    y.backward()
+
+    jacs = []
+    for x in xs:
+        if x.grad is None:
+            jacs.append(np.zeros(y.shape + x.shape, dtype=y.dtype))
+        else:
+            jacs.append(batch_sum_to(x.grad, x.shape).reshape(
+                y.shape + x.shape))
+    return jacs if len(jacs) > 1 else jacs[0]
+
+
+def grad_graph(f, x):
+    x = Variable(x.data if isinstance(x, Variable) else np.asarray(x))
+    y = f(x)
+    y.backward(create_graph=True)
+    gx = x.grad
+    x.cleargrad()
+    if not isinstance(gx, Variable) or gx.creator is None:
+        gx = None  # f is at most linear in x
+    return x, gx
+
+
+def hessian(f, x):
+    x, gx = grad_graph(f, x)
+    if gx is None:
+        return np.zeros(x.shape + x.shape, dtype=x.dtype)
+    gx.grad = seeds(x.shape, x.dtype)
+    gx.backward()
+    return batch_sum_to(x.grad, x.shape).reshape(x.shape + x.shape)
+
+
+def hvp(f, x, v):
+    # v is one vector shaped like x, or a stack of them along axis 0
+    x, gx = grad_graph(f, x)
+    v = np.asarray(v)
+    if gx is None:
+        return np.zeros_like(v, dtype=x.dtype)
+    batched = v.shape != x.shape
+    gx.grad = v if batched else v[np.newaxis]
+    gx.backward()
+    h = batch_sum_to(x.grad, x.shape)
+    return h if batched else h[0]
+
+
+def vmap(f, in_axes=0):
+    # maps f over a leading batch axis in a single call; in_axes holds 0 or
+    # None per argument
+    def mapped(*xs):
+        axes = in_axes if isinstance(in_axes, (tuple, list)) else \
+            (in_axes,) * len(xs)
+        ndims = [np.ndim(x.data if isinstance(x, Variable) else x) -
+                 (axis is not None) for x, axis in zip(xs, axes)]
+        ndim = max(ndims)
+
+        # line up the per-example axes of batched and unbatched arguments
+        args = []
+        for x, axis, n in zip(xs, axes, ndims):
+            if axis is not None and n < ndim:
+                if isinstance(x, Variable):
+                    raise ValueError('batched Variables must have the same '
+                                     'per-example rank as the other inputs')
+                x = np.asarray(x)
+                x = x.reshape(x.shape[:1] + (1,) * (ndim - n) + x.shape[1:])
+            args.append(x)
+        return f(*args)
+    return mapped
@@ -0,0 +1,33 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import unittest
+import numpy as np
+from dezero import Variable
+
+
+class BackwardTwiceTest(unittest.TestCase):
+    def test_released_graph(self):
+        x = Variable(np.array(3.0))
+        y = x * x
+        y.backward()
+        with self.assertRaisesRegex(RuntimeError, 'retain_graph=True'):
+            y.backward()
+
+    def test_released_graph_workers(self):
+        x = Variable(np.array(3.0))
+        y = x * x + x
+        y.backward(workers=2)
+        with self.assertRaisesRegex(RuntimeError, 'retain_graph=True'):
+            y.backward(workers=2)
+
+    def test_retain_graph(self):
+        x = Variable(np.array(3.0))
+        y = x * x
+        y.backward(retain_graph=True)
+        y.backward()
+        self.assertEqual(x.grad, 12.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import unittest
+import numpy as np
+from dezero import Variable, checkpoint, trace
+
+
+class CheckpointParamsTest(unittest.TestCase):
+    def test_data_input(self):
+        w = Variable(np.array(2.0))
+        x = np.array(3.0)
+        y = checkpoint(lambda t: t * w, x) + x * w
+        y.backward()
+        self.assertEqual(w.grad, 6.0)
+
+    def test_only_param_needs_grad(self):
+        w = Variable(np.array(2.0))
+        x = Variable(np.array(3.0), requires_grad=False)
+        y = checkpoint(lambda t: t * w * w, x)
+        y.backward()
+        self.assertEqual(w.grad, 12.0)
+        self.assertIsNone(x.grad)
+
+    def test_param_and_input(self):
+        w = Variable(np.array(2.0))
+        x = Variable(np.array(3.0))
+        y = checkpoint(lambda t: t * t * w, x)
+        y.backward()
+        self.assertEqual(x.grad, 12.0)
+        self.assertEqual(w.grad, 9.0)
+
+
+class TraceParamsTest(unittest.TestCase):
+    def test_data_input(self):
+        w = Variable(np.array(2.0))
+        f = trace(lambda x: x * w * w)
+        for i in range(3):
+            w.cleargrad()
+            w.data = np.array(i + 1.0)
+            y = f(np.ones(2))
+            y.backward()
+            np.testing.assert_array_equal(y.data, [(i + 1) ** 2] * 2)
+            np.testing.assert_array_equal(w.grad, [2 * (i + 1)] * 2)
+
+    def test_fused(self):
+        w = Variable(np.full(3, 2.0))
+        x = Variable(np.arange(3.0))
+        f = trace(lambda x: (x * w + w) * w, fuse=True)
+        for _ in range(2):
+            x.cleargrad()
+            w.cleargrad()
+            y = f(x)
+            y.backward()
+            np.testing.assert_array_equal(x.grad, [4, 4, 4])
+            np.testing.assert_array_equal(w.grad, [4, 8, 12])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import asyncio
+import contextvars
+import sys
+import threading
+import unittest
+import numpy as np
+import dezero
+from dezero import Variable, Config, checkpoint, no_grad, using_config
+
+
+class ConfigAssignTest(unittest.TestCase):
+    def test_assign(self):
+        def run():
+            Config.enable_backprop = False
+            y = Variable(np.array(1.0)) * 2
+            self.assertIsNone(y.creator)
+            Config.enable_backprop = True
+            with no_grad():
+                self.assertFalse(Config.enable_backprop)
+            self.assertTrue(Config.enable_backprop)
+            y = Variable(np.array(1.0)) * 2
+            self.assertIsNotNone(y.creator)
+
+        contextvars.copy_context().run(run)
+        self.assertTrue(Config.enable_backprop)
+
+
+class ConfigSettingsTest(unittest.TestCase):
+    def test_train(self):
+        self.assertTrue(Config.train)
+        with dezero.test_mode():
+            self.assertFalse(Config.train)
+            self.assertTrue(Config.enable_backprop)
+        self.assertTrue(Config.train)
+
+    def test_train_in_checkpoint(self):
+        # the segment is recomputed during backward, outside test_mode
+        def f(x):
+            return x * 2.0 if Config.train else x * 3.0
+        x = Variable(np.array(1.0))
+        with dezero.test_mode():
+            y = checkpoint(f, x)
+        y.backward()
+        self.assertEqual(y.data, 3.0)
+        self.assertEqual(x.grad, 3.0)
+
+    def test_unknown_name(self):
+        with using_config('test_unknown_flag', 1):
+            self.assertEqual(Config.test_unknown_flag, 1)
+            with using_config('test_unknown_flag', 2):
+                self.assertEqual(Config.test_unknown_flag, 2)
+            self.assertEqual(Config.test_unknown_flag, 1)
+        self.assertIsNone(Config.test_unknown_flag)
+
+    def test_unknown_name_is_context_local(self):
+        seen = []
+
+        def run():
+            Config.test_local_flag = 'set'
+            seen.append(Config.test_local_flag)
+
+        contextvars.copy_context().run(run)
+        thread = threading.Thread(
+            target=lambda: seen.append(Config.test_local_flag))
+        thread.start()
+        thread.join()
+        self.assertEqual(seen, ['set', None])
+        self.assertIsNone(Config.test_local_flag)
+
+    def test_not_a_setting(self):
+        with self.assertRaisesRegex(AttributeError, 'not a Config setting'):
+            with using_config('__doc__', 'x'):
+                pass
+
+
+class ConfigStressTest(unittest.TestCase):
+    # no_grad in one thread or asyncio task must not leak into another
+
+    def setUp(self):
+        self.interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-5)
+
+    def tearDown(self):
+        sys.setswitchinterval(self.interval)
+
+    def test_threads(self):
+        errors = []
+        barrier = threading.Barrier(8)
+
+        def train(k):
+            barrier.wait()
+            for i in range(500):
+                x = Variable(np.array(float(i)))
+                y = x * x + 3 * x
+                if y.creator is None:
+                    errors.append(('no graph', k, i))
+                    return
+                y.backward()
+                if x.grad != 2 * i + 3:
+                    errors.append(('grad', k, i))
+
+        def infer(k):
+            barrier.wait()
+            with no_grad():
+                for i in range(500):
+                    x = Variable(np.array(float(i)))
+                    y = x * x + 3 * x
+                    if y.creator is not None:
+                        errors.append(('graph', k, i))
+                        return
+
+        threads = [threading.Thread(target=train if k % 2 else infer,
+                                    args=(k,)) for k in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+
+    def test_asyncio(self):
+        async def task(grad):
+            for _ in range(200):
+                if grad:
+                    await asyncio.sleep(0)
+                    y = Variable(np.array(1.0)) * 2
+                    assert y.creator is not None
+                else:
+                    with no_grad():
+                        await asyncio.sleep(0)
+                        y = Variable(np.array(1.0)) * 2
+                        assert y.creator is None
+
+        async def main():
+            await asyncio.gather(*[task(i % 2) for i in range(10)])
+
+        asyncio.run(main())
+
+
+if __name__ == '__main__':
+    unittest.main()
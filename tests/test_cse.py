@@ -0,0 +1,101 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import gc
+import unittest
+import weakref
+import numpy as np
+from dezero import Variable, Config, using_cse, no_grad
+from dezero.optimizers import NewtonCG
+
+
+def rosenbrock(x0, x1):
+    return 100 * (x1 - x0 ** 2) ** 2 + (1 - x0) ** 2
+
+
+class CSETest(unittest.TestCase):
+    def test_shared(self):
+        x = Variable(np.array(3.0))
+        with using_cse():
+            a = x * x
+            b = x * x
+            y = a + b
+        self.assertIs(a, b)
+        y.backward()
+        self.assertEqual(x.grad, 12.0)
+
+    def test_inputs_not_held(self):
+        with using_cse():
+            x = Variable(np.ones(10))
+            ref = weakref.ref(x)
+            y = x * 2.0
+            y.backward()
+            del x, y
+            gc.collect()
+            self.assertIsNone(ref())
+            self.assertEqual(len(Config.cse), 0)
+
+    def test_no_hit_after_id_reuse(self):
+        # without a graph the outputs do not hold their inputs, so a new
+        # input may get the id of a dead one while its output lives on
+        outputs = []
+        with using_cse(), no_grad():
+            for i in range(20):
+                x = Variable(np.array(float(i)))
+                y = x * x
+                self.assertEqual(y.data, i * i)
+                outputs.append(y)
+                del x, y
+
+    def test_no_hit_after_inplace_change(self):
+        x = Variable(np.array(2.0))
+        with using_cse(), no_grad():
+            y1 = x * x
+            x.data[...] = 3.0
+            y2 = x * x
+        self.assertEqual(y1.data, 4.0)
+        self.assertEqual(y2.data, 9.0)
+
+    def test_no_hit_after_new_data(self):
+        x = Variable(np.ones(4))
+        with using_cse(), no_grad():
+            y1 = x + 1.0
+            x.data = np.ones((2, 2))
+            y2 = x + 1.0
+        self.assertEqual(y1.shape, (4,))
+        self.assertEqual(y2.shape, (2, 2))
+
+    def descend(self, steps):
+        # mutate-and-recompute: every step updates the leaves in place and
+        # builds the graph again from the same Variables
+        x0, x1 = Variable(np.array(0.0)), Variable(np.array(2.0))
+        for i in range(steps):
+            x0.cleargrad()
+            x1.cleargrad()
+            y = rosenbrock(x0, x1)
+            y.backward(retain_graph=True)
+            x0.data -= 0.001 * x0.grad
+            x1.data -= 0.001 * x1.grad
+        return x0.data, x1.data
+
+    def test_gradient_descent_loop(self):
+        expected = self.descend(100)
+        with using_cse():
+            actual = self.descend(100)
+        np.testing.assert_array_equal(actual, expected)
+
+    def test_newton_cg_loop(self):
+        x0, x1 = Variable(np.array(0.0)), Variable(np.array(2.0))
+        optimizer = NewtonCG().setup([x0, x1])
+        with using_cse():
+            for i in range(20):
+                x0.cleargrad()
+                x1.cleargrad()
+                y = rosenbrock(x0, x1)
+                y.backward(create_graph=True)
+                optimizer.update()
+        np.testing.assert_allclose([x0.data, x1.data], [1.0, 1.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import unittest
+import numpy as np
+from dezero import Variable, using_dtype
+from dezero.optimizers import SGD
+
+
+class Float32PolicyTest(unittest.TestCase):
+    # a step51-style loop: minibatches of float64 data, a small model with
+    # Python and NumPy constants, SGD; nothing may come out as float64.
+    # The ops here are elementwise without sum_to, so the parameters have
+    # the shape of a batch
+
+    def test_training_loop(self):
+        rs = np.random.RandomState(0)
+        x_train = rs.randn(100, 8)
+        t_train = np.sin(x_train)
+        batch_size, max_epoch = 20, 3
+
+        with using_dtype(np.float32):
+            W1 = Variable(rs.randn(batch_size, 8) * 0.1)
+            b1 = Variable(np.zeros((batch_size, 8)))
+            W2 = Variable(rs.randn(batch_size, 8) * 0.1)
+            params = [W1, b1, W2]
+            optimizer = SGD(lr=0.1).setup(params)
+
+            arrays = []
+            for epoch in range(max_epoch):
+                index = rs.permutation(len(x_train))
+                for i in range(0, len(x_train), batch_size):
+                    batch = index[i:i + batch_size]
+                    x, t = x_train[batch], t_train[batch]
+
+                    h = Variable(x) * W1 + b1
+                    h = 1.0 / (h * h + 1) * W2 - np.float64(0.1)
+                    y = h * 2 + 0.5
+                    loss = (y - t) ** 2 / len(batch)
+
+                    for p in params:
+                        p.cleargrad()
+                    loss.backward(retain_grad=True)
+                    optimizer.update()
+                    arrays += [v.data for v in (h, y, loss)]
+                    arrays += [v.grad for v in (h, y, loss)]
+                    arrays += [p.grad for p in params]
+            arrays += [p.data for p in params]
+
+        dtypes = {a.dtype for a in arrays}
+        self.assertEqual(dtypes, {np.dtype(np.float32)})
+
+    def test_pow_numpy_exponent(self):
+        for c in (np.float64(2), np.array(2.0), 2, 2.0):
+            with using_dtype(np.float32):
+                x = Variable(np.array([1.0, 2.0]))
+                y = x ** c
+                y.backward()
+            self.assertEqual(y.dtype, np.float32)
+            self.assertEqual(x.grad.dtype, np.float32)
+            np.testing.assert_array_equal(y.data, [1.0, 4.0])
+            np.testing.assert_array_equal(x.grad, [2.0, 4.0])
+
+    def test_pow_exponent_without_policy(self):
+        # NumPy scalars keep their dtype when there is no policy
+        x = Variable(np.array([1.0, 2.0], dtype=np.float32))
+        self.assertEqual((x ** np.float64(2)).dtype, np.float64)
+        self.assertEqual((x ** 2).dtype, np.float32)
+
+
+if __name__ == '__main__':
+    unittest.main()
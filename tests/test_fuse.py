@@ -0,0 +1,101 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import unittest
+import numpy as np
+from dezero import Variable, trace
+from dezero.transforms import Fused
+
+
+def rosenbrock(x0, x1):
+    return 100 * (x1 - x0 ** 2) ** 2 + (x0 - 1) ** 2
+
+
+def goldstein(x, y):
+    z = (1 + (x + y + 1)**2 * (19 - 14*x + 3*x**2 - 14*y + 6*x*y + 3*y**2)) * \
+        (30 + (2*x - 3*y)**2 * (18 - 32*x + 12*x**2 + 48*y - 36*x*y + 27*y**2))
+    return z
+
+
+def every_op(x, y):
+    a = x * y - x / y + (-x) ** 3
+    b = 2.0 / (a + 3.0) - (1.0 - y) * 0.5
+    return a * b / 4.0 - x + x * x - y / y
+
+
+def grads(f, fused, *xs, calls=2):
+    g = trace(f, fuse=True) if fused else f
+    for _ in range(calls):
+        vs = [Variable(x.copy()) for x in xs]
+        y = g(*vs)
+        y.backward()
+    return y.data, [v.grad for v in vs], g
+
+
+class FuseTest(unittest.TestCase):
+    def check(self, f, *xs):
+        y0, g0, _ = grads(f, False, *xs)
+        y1, g1, traced = grads(f, True, *xs)
+        np.testing.assert_allclose(y1, y0)
+        for a, b in zip(g1, g0):
+            np.testing.assert_allclose(a, b)
+        plan = next(iter(traced.plans.values()))
+        self.assertTrue(any(isinstance(f, Fused) for f, _ in plan.entries))
+        return plan
+
+    def test_rosenbrock(self):
+        np.random.seed(0)
+        self.check(rosenbrock, np.random.rand(5), np.random.rand(5))
+
+    def test_goldstein(self):
+        np.random.seed(0)
+        self.check(goldstein, np.random.rand(5), np.random.rand(5))
+
+    def test_every_op(self):
+        np.random.seed(0)
+        self.check(every_op, np.random.rand(5) + 1, np.random.rand(5) + 1)
+
+    def test_two_outputs(self):
+        # both outputs come out of one fused node and a feeds both
+        def f(x):
+            a = x * x + 1.0
+            return a * a, a - x
+        for calls in (1, 2):
+            ys = []
+            for fused in (False, True):
+                g = trace(f, fuse=True) if fused else f
+                x = Variable(np.arange(1.0, 4.0))
+                y0, y1 = g(x)
+                y = y0 * y1
+                y.backward()
+                ys.append(x.grad)
+            np.testing.assert_allclose(ys[1], ys[0])
+
+    def test_nothing_held_between_calls(self):
+        np.random.seed(0)
+        plan = self.check(rosenbrock, np.random.rand(5), np.random.rand(5))
+        for f, _ in plan.entries:
+            if isinstance(f, Fused):
+                self.assertIsNone(f.vals)
+
+    def test_with_memory_plan(self):
+        np.random.seed(0)
+        x0, x1 = np.random.rand(10 ** 4), np.random.rand(10 ** 4)
+        _, g0, _ = grads(rosenbrock, False, x0, x1)
+        f = trace(rosenbrock, fuse=True, plan_memory=True)
+        for _ in range(3):
+            vs = [Variable(x0.copy()), Variable(x1.copy())]
+            f(*vs).backward()
+            for v, g in zip(vs, g0):
+                np.testing.assert_allclose(v.grad, g)
+
+    def test_outputs_not_reused(self):
+        # the arrays handed out must survive the next call
+        f = trace(lambda x: (x * 2.0 + 1.0) * 3.0, fuse=True)
+        y0 = f(Variable(np.ones(3)))
+        f(Variable(np.zeros(3)))
+        np.testing.assert_array_equal(y0.data, [9.0, 9.0, 9.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
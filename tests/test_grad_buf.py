@@ -0,0 +1,53 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import unittest
+import numpy as np
+from dezero import Variable
+
+
+class GradBufTest(unittest.TestCase):
+    def test_backward_twice(self):
+        x = Variable(np.array(1.0))
+        a = x + 0.0
+        y = a + a
+        y.backward(retain_graph=True)
+        y.grad = np.array(3.0)
+        y.backward(retain_graph=True)
+        self.assertEqual(x.grad, 8.0)
+
+    def test_saved_grads(self):
+        w = Variable(np.array([1.0, 2.0, 3.0]))
+        grads = []
+        for i in range(3):
+            w.cleargrad()
+            y = w * float(i + 1) + w * 0.0
+            y.backward()
+            grads.append(w.grad)
+        for i, g in enumerate(grads):
+            np.testing.assert_array_equal(g, [i + 1.0] * 3)
+
+    def test_saved_view(self):
+        w = Variable(np.ones(3))
+        y = w + w
+        y.backward(retain_graph=True)
+        y.backward()
+        view = w.grad[:]
+        w.cleargrad()
+        y = w + w
+        y.backward()
+        np.testing.assert_array_equal(view, [4.0, 4.0, 4.0])
+
+    def test_buffer_reused(self):
+        w = Variable(np.ones(3))
+        bufs = set()
+        for _ in range(3):
+            w.cleargrad()
+            y = w * 2.0 + w
+            y.backward()
+            bufs.add(id(w.grad_buf))
+        self.assertEqual(len(bufs), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
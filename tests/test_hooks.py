@@ -0,0 +1,65 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import unittest
+import numpy as np
+from dezero import Variable, checkpoint, trace, using_tape
+from dezero.optimizers import SGD
+
+
+def seg(t, w):
+    return t * w * w
+
+
+class HookTest(unittest.TestCase):
+    def run_hooked(self, backward):
+        w = Variable(np.array(2.0))
+        x = Variable(np.array(3.0))
+        seen = []
+        w.register_hook(lambda p: seen.append(float(p.grad)))
+        backward(x, w)
+        self.assertEqual(seen, [13.0])  # once, with the final gradient
+
+    def test_plain(self):
+        self.run_hooked(lambda x, w: (seg(x, w) + w).backward())
+
+    def test_workers(self):
+        self.run_hooked(lambda x, w: (seg(x, w) + w).backward(workers=2))
+
+    def test_checkpoint(self):
+        self.run_hooked(
+            lambda x, w: (checkpoint(lambda t: seg(t, w), x) + w).backward())
+
+    def test_trace(self):
+        def backward(x, w):
+            f = trace(lambda t: seg(t, w) + w)
+            f(x)
+            f(x).backward()
+        self.run_hooked(backward)
+
+    def test_tape(self):
+        def backward(x, w):
+            with using_tape() as tape:
+                y = seg(x, w) + w
+            tape.backward(y)
+        self.run_hooked(backward)
+
+
+class OverlapTest(unittest.TestCase):
+    def train(self, overlap):
+        w = Variable(np.array(1.0))
+        x = Variable(np.array(0.5))
+        optimizer = SGD(lr=0.1, overlap=overlap).setup([w])
+        for _ in range(3):
+            w.cleargrad()
+            y = checkpoint(lambda t: t * w * w, x) + w * w
+            y.backward()
+            optimizer.update()
+        return float(w.data)
+
+    def test_overlap_checkpoint(self):
+        self.assertEqual(self.train(True), self.train(False))
+
+
+if __name__ == '__main__':
+    unittest.main()
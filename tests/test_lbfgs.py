@@ -0,0 +1,39 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import unittest
+import numpy as np
+from dezero import Variable
+from dezero.optimizers import LBFGS
+
+
+class LBFGSTest(unittest.TestCase):
+    def minimize(self, w, loss_fn):
+        optimizer = LBFGS(max_iter=50).setup([w])
+
+        def closure():
+            w.cleargrad()
+            loss = loss_fn(w)
+            loss.backward()
+            return loss
+
+        return optimizer.update(closure)
+
+    def test_float32(self):
+        w = Variable(np.array([3.0, -2.0], dtype=np.float32))
+        data = w.data
+        self.minimize(w, lambda w: (w - 1.0) ** 2)
+        self.assertIs(w.data, data)
+        self.assertEqual(w.dtype, np.float32)
+        np.testing.assert_allclose(w.data, [1.0, 1.0], atol=1e-3)
+
+    def test_shape1_loss(self):
+        w = Variable(np.array([3.0]))
+        f = self.minimize(w, lambda w: (w - 1.0) ** 2 + 2.0)
+        self.assertIsInstance(f, float)
+        self.assertAlmostEqual(f, 2.0)
+        np.testing.assert_allclose(w.data, [1.0], atol=1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import unittest
+import numpy as np
+from dezero import Variable, no_grad
+from dezero.optimizers import NewtonCG
+
+
+def rosenbrock(x0, x1):
+    return 100 * (x1 - x0 ** 2) ** 2 + (1 - x0) ** 2
+
+
+def step(optimizer, params, loss_fn):
+    for p in params:
+        p.cleargrad()
+    loss = loss_fn(*params)
+    loss.backward(create_graph=True)
+    optimizer.update()
+    return loss
+
+
+class NewtonCGTest(unittest.TestCase):
+    def test_quadratic_in_one_step(self):
+        # the gradient of each parameter depends on the other, so the
+        # Hessian-vector products need the cross terms of both roots
+        a = Variable(np.array(4.0))
+        b = Variable(np.array(-2.0))
+        loss_fn = lambda a, b: (a + 2.0 * b - 3.0) ** 2 + (a - b) ** 2
+        optimizer = NewtonCG(max_iter=10, tol=1e-12).setup([a, b])
+        step(optimizer, [a, b], loss_fn)
+        np.testing.assert_allclose(a.data, 1.0)
+        np.testing.assert_allclose(b.data, 1.0)
+
+    def test_one_pass_per_product(self):
+        a, b = Variable(np.array(4.0)), Variable(np.array(-2.0))
+        loss = (a * b - 3.0) ** 2 + a ** 2 * b ** 2
+        loss.backward(create_graph=True)
+        passes = []
+        a.register_hook(lambda a: passes.append(a))
+        NewtonCG(max_iter=1).setup([a, b]).update()
+        self.assertEqual(len(passes), 1)
+
+    def test_rosenbrock(self):
+        x0, x1 = Variable(np.array(0.0)), Variable(np.array(2.0))
+        optimizer = NewtonCG().setup([x0, x1])
+        for i in range(20):
+            step(optimizer, [x0, x1], rosenbrock)
+        np.testing.assert_allclose([x0.data, x1.data], [1.0, 1.0])
+
+    def test_under_no_grad(self):
+        # the update itself may run with recording switched off
+        x0, x1 = Variable(np.array(0.0)), Variable(np.array(2.0))
+        optimizer = NewtonCG().setup([x0, x1])
+        for i in range(20):
+            x0.cleargrad()
+            x1.cleargrad()
+            rosenbrock(x0, x1).backward(create_graph=True)
+            with no_grad():
+                optimizer.update()
+        np.testing.assert_allclose([x0.data, x1.data], [1.0, 1.0])
+
+    def test_first_order_grads_left(self):
+        x = Variable(np.array(2.0))
+        optimizer = NewtonCG().setup([x])
+        step(optimizer, [x], lambda x: x ** 4)
+        self.assertEqual(x.grad, 32.0)
+
+    def test_needs_create_graph(self):
+        x = Variable(np.array(2.0))
+        (x ** 2).backward()
+        with self.assertRaisesRegex(ValueError, 'create_graph'):
+            NewtonCG().setup([x]).update()
+
+
+if __name__ == '__main__':
+    unittest.main()
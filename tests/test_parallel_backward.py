@@ -0,0 +1,99 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import unittest
+import numpy as np
+from dezero import Variable, Function
+
+
+class Split(Function):
+    # two outputs, for graphs where one of them is dropped
+    def forward(self, x):
+        return x * 2.0, x * 3.0
+
+    def backward(self, gy0, gy1):
+        gx = 0
+        if gy0 is not None:
+            gx = gx + gy0 * 2.0
+        if gy1 is not None:
+            gx = gx + gy1 * 3.0
+        return gx
+
+
+def fan_out(x, w, width=16, depth=4):
+    # width independent chains that all read x and w, summed at the end
+    total = None
+    for i in range(width):
+        h = x * (i + 1.0) + w
+        for _ in range(depth):
+            h = h * w - h / (i + 2.0)
+        total = h if total is None else total + h
+    return total
+
+
+def grads(build, workers, *datas):
+    xs = [Variable(d.copy()) for d in datas]
+    y = build(*xs)
+    y.backward(workers=workers)
+    return [x.grad for x in xs]
+
+
+class ParallelBackwardTest(unittest.TestCase):
+    def check(self, build, *datas):
+        expected = grads(build, None, *datas)
+        first = None
+        for workers in (1, 2, 4):
+            for _ in range(3):
+                actual = grads(build, workers, *datas)
+                for a, e in zip(actual, expected):
+                    np.testing.assert_allclose(a, e, rtol=1e-12)
+                # a fixed summation order: the same bits for any workers
+                if first is None:
+                    first = actual
+                for a, f in zip(actual, first):
+                    np.testing.assert_array_equal(a, f)
+
+    def test_wide_fan_out(self):
+        np.random.seed(0)
+        self.check(fan_out, np.random.rand(1000), np.random.rand(1000))
+
+    def test_shared_intermediate(self):
+        def build(x):
+            a = x * x
+            b = a * a + a * 3.0 - a / 2.0
+            return b * a + a
+        self.check(build, np.array([0.5, 1.0, 2.0]))
+
+    def test_dead_output(self):
+        def build(x):
+            y0, y1 = Split()(x)
+            del y1  # its weakref in the Split node is dead by backward
+            return y0 * y0
+        self.check(build, np.array([1.0, 2.0]))
+
+    def test_both_outputs_used(self):
+        def build(x):
+            y0, y1 = Split()(x * x)
+            return y0 * y1 + y1
+        self.check(build, np.array([1.0, -2.0]))
+
+    def test_retain_grad(self):
+        for workers in (None, 2):
+            x = Variable(np.array(2.0))
+            a = x * x
+            y = a * a + a
+            y.backward(retain_grad=True, workers=workers)
+            self.assertEqual(a.grad, 9.0)
+            self.assertEqual(x.grad, 36.0)
+
+    def test_hook_once(self):
+        calls = []
+        x = Variable(np.ones(3))
+        x.register_hook(lambda x: calls.append(x.grad.copy()))
+        fan_out(x, Variable(np.ones(3)), width=8).backward(workers=4)
+        self.assertEqual(len(calls), 1)
+        np.testing.assert_array_equal(calls[0], x.grad)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import tracemalloc
+import unittest
+import numpy as np
+from dezero import Variable, Function, trace
+from dezero.profiler import profile
+
+
+class ProfilerTest(unittest.TestCase):
+    def test_nested_backward(self):
+        f = trace(lambda x: x * x * x + x)
+        x = Variable(np.ones(1000))
+        f(x)
+        with profile() as prof:
+            y = f(x)
+            y.backward()
+
+        events = [e for e in prof.events if e['phase'] == 'backward']
+        replay, = [e for e in events if e['name'] == 'Replay']
+        inner = [e for e in events if e['name'] != 'Replay']
+        self.assertTrue(inner)
+        nested = sum(e['duration'] for e in inner)
+        self.assertEqual(replay['self'], replay['duration'] - nested)
+        for e in inner:
+            self.assertEqual(e['self'], e['duration'])
+
+        # self times of the rows add up to the time spent, not more
+        table = prof.summary()
+        total = sum(row['self'] for (_, phase), row in table.items()
+                    if phase == 'backward')
+        self.assertEqual(total, replay['duration'])
+
+    def test_output_bytes(self):
+        x = Variable(np.ones(10))
+        with profile() as prof:
+            x * 2.0
+        event, = prof.events
+        self.assertEqual(event['output_bytes'], 80)
+
+    def test_allocated_bytes(self):
+        x = Variable(np.ones(10 ** 5))
+        with profile() as prof:
+            y = x * 2.0 + 1.0
+            y.backward()
+        self.assertFalse(tracemalloc.is_tracing())
+        for e in prof.events:
+            if e['phase'] == 'forward':
+                # at least the output array, 800 kB
+                self.assertGreaterEqual(e['allocated_bytes'], 8 * 10 ** 5)
+        table = prof.summary()
+        self.assertGreaterEqual(table[('MulConst', 'forward')]
+                                ['allocated_bytes'], 8 * 10 ** 5)
+
+    def test_temporaries_counted(self):
+        # the square dies inside forward, only a 0-d array comes out
+        class SumOfSquares(Function):
+            def forward(self, x):
+                return np.array((x * x).sum())
+
+        with profile() as prof:
+            SumOfSquares()(Variable(np.ones(10 ** 5)))
+        event, = prof.events
+        self.assertEqual(event['output_bytes'], 8)
+        self.assertGreaterEqual(event['allocated_bytes'], 8 * 10 ** 5)
+
+    def test_nested_allocated_bytes(self):
+        f = trace(lambda x: x * x * x + x)
+        x = Variable(np.ones(10 ** 5))
+        f(x)
+        with profile() as prof:
+            f(x).backward()
+        events = [e for e in prof.events if e['phase'] == 'backward']
+        replay, = [e for e in events if e['name'] == 'Replay']
+        inner = [e['allocated_bytes'] for e in events if e is not replay]
+        self.assertGreaterEqual(replay['allocated_bytes'], max(inner))
+
+    def test_memory_off(self):
+        with profile(memory=False) as prof:
+            Variable(np.ones(10)) * 2.0
+        event, = prof.events
+        self.assertIsNone(event['allocated_bytes'])
+        self.assertEqual(prof.summary()[('MulConst', 'forward')]
+                         ['allocated_bytes'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
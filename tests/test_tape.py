@@ -0,0 +1,52 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import unittest
+import numpy as np
+from dezero import Variable, using_tape
+
+
+def goldstein(x, y):
+    z = (1 + (x + y + 1)**2 * (19 - 14*x + 3*x**2 - 14*y + 6*x*y + 3*y**2)) * \
+        (30 + (2*x - 3*y)**2 * (18 - 32*x + 12*x**2 + 48*y - 36*x*y + 27*y**2))
+    return z
+
+
+class TapeTest(unittest.TestCase):
+    def test_same_grads_as_graph(self):
+        x0, y0 = Variable(np.array(1.0)), Variable(np.array(1.0))
+        z = goldstein(x0, y0)
+        z.backward()
+
+        x1, y1 = Variable(np.array(1.0)), Variable(np.array(1.0))
+        with using_tape() as tape:
+            z = goldstein(x1, y1)
+        tape.backward(z)
+        self.assertEqual(x1.grad, x0.grad)
+        self.assertEqual(y1.grad, y0.grad)
+        self.assertEqual(x1.grad, -5376.0)
+        self.assertEqual(y1.grad, 8064.0)
+
+    def test_shared_intermediate(self):
+        x0 = Variable(np.array([1.0, 2.0, 3.0]))
+        a = x0 * x0
+        y = a * a + a * 3.0
+        y.backward()
+
+        x1 = Variable(np.array([1.0, 2.0, 3.0]))
+        with using_tape() as tape:
+            a = x1 * x1
+            y = a * a + a * 3.0
+        tape.backward(y)
+        np.testing.assert_allclose(x1.grad, x0.grad)
+
+    def test_graph_backward_on_tape_output(self):
+        x = Variable(np.array(2.0))
+        with using_tape():
+            y = x * x
+        with self.assertRaisesRegex(RuntimeError, r'tape\.backward\(y\)'):
+            y.backward()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,21 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import unittest
+import numpy as np
+from dezero import taylor
+
+
+class TaylorPowTest(unittest.TestCase):
+    def test_integral_exponents_at_zero(self):
+        for c in (2, 2.0, np.int64(2), np.float32(2.0)):
+            derivs = taylor(lambda x: x ** c, np.array(0.0), 3)
+            np.testing.assert_array_equal(derivs, [0.0, 0.0, 2.0, 0.0])
+
+    def test_fractional_exponent(self):
+        derivs = taylor(lambda x: x ** 0.5, np.array(4.0), 2)
+        np.testing.assert_allclose(derivs, [2.0, 0.25, -1 / 32])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import threading
+import unittest
+import numpy as np
+from dezero import Variable, trace
+from dezero.transforms import Plan
+
+
+class TraceControlFlowTest(unittest.TestCase):
+    def test_branch_on_input(self):
+        f = trace(lambda x: x * 2 if x.data.sum() > 0 else x * 3)
+        np.testing.assert_array_equal(f(np.ones(2)).data, [2, 2])
+        np.testing.assert_array_equal(f(-np.ones(2)).data, [-3, -3])
+
+    def test_branch_on_closure_variable(self):
+        w = Variable(np.array(1.0))
+        f = trace(lambda x: x * w * 2 if w.data > 0 else x * w * 3)
+        np.testing.assert_array_equal(f(np.ones(2)).data, [2, 2])
+        w.data = np.array(-1.0)
+        np.testing.assert_array_equal(f(np.ones(2)).data, [-3, -3])
+        self.assertEqual(type(w.data), np.ndarray)
+
+    def test_branch_on_element(self):
+        f = trace(lambda x: x * 2 if x.data[0] > 0 else x * 3)
+        np.testing.assert_array_equal(f(np.array([1.0, 2.0])).data, [2, 4])
+        np.testing.assert_array_equal(f(np.array([-1.0, 2.0])).data, [-3, 6])
+
+    def test_branch_on_tolist(self):
+        f = trace(lambda x: x * 2 if max(x.data.tolist()) > 0 else x * 3)
+        np.testing.assert_array_equal(f(np.ones(2)).data, [2, 2])
+        np.testing.assert_array_equal(f(-np.ones(2)).data, [-3, -3])
+
+    def test_branch_on_iterated_element(self):
+        f = trace(lambda x: x * 2 if all(v > 0 for v in x.data) else x * 3)
+        np.testing.assert_array_equal(f(np.ones(2)).data, [2, 2])
+        np.testing.assert_array_equal(f(-np.ones(2)).data, [-3, -3])
+
+    def test_closure_variable_replayed(self):
+        w = Variable(np.array(2.0))
+        f = trace(lambda x: x * w)
+        f(np.ones(2))
+        w.data = np.array(5.0)
+        np.testing.assert_array_equal(f(np.ones(2)).data, [5, 5])
+        self.assertFalse(next(iter(f.plans.values())).dynamic)
+
+    def test_threads(self):
+        # a branch taken while tracing in one thread must not mark a plan
+        # traced at the same time in another thread
+        barrier = threading.Barrier(2, timeout=10)
+
+        def branchy(x):
+            barrier.wait()
+            y = x * 2 if x.data.sum() > 0 else x * 3
+            barrier.wait()
+            return y
+
+        def straight(x):
+            barrier.wait()
+            barrier.wait()
+            return x * 2
+
+        plans = {}
+
+        def build(f):
+            plans[f] = Plan(f, [Variable(np.ones(2))])
+
+        threads = [threading.Thread(target=build, args=(f,))
+                   for f in (branchy, straight)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertTrue(plans[branchy].dynamic)
+        self.assertFalse(plans[straight].dynamic)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+if '__file__' in globals():
+    import os, sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import unittest
+import numpy as np
+from dezero import Variable, jacobian, hessian, hvp, vmap
+
+
+def rosenbrock(x0, x1):
+    return 100 * (x1 - x0 ** 2) ** 2 + (1 - x0) ** 2
+
+
+def goldstein(x, y):
+    z = (1 + (x + y + 1)**2 * (19 - 14*x + 3*x**2 - 14*y + 6*x*y + 3*y**2)) * \
+        (30 + (2*x - 3*y)**2 * (18 - 32*x + 12*x**2 + 48*y - 36*x*y + 27*y**2))
+    return z
+
+
+def numerical_jacobian(f, xs, i, eps=1e-6):
+    # central differences of f(*xs).data with respect to xs[i]
+    x = np.asarray(xs[i], dtype=np.float64)
+    y = f(*[Variable(np.asarray(a)) for a in xs]).data
+    jac = np.zeros(y.shape + x.shape)
+    for idx in np.ndindex(*x.shape):
+        hi, lo = x.copy(), x.copy()
+        hi[idx] += eps
+        lo[idx] -= eps
+        args_hi = [Variable(np.asarray(a)) for a in xs]
+        args_lo = [Variable(np.asarray(a)) for a in xs]
+        args_hi[i], args_lo[i] = Variable(hi), Variable(lo)
+        d = (f(*args_hi).data - f(*args_lo).data) / (2 * eps)
+        jac[(Ellipsis,) + idx] = d
+    return jac
+
+
+def scalar_grads(f, *xs):
+    vs = [Variable(np.array(x)) for x in xs]
+    f(*vs).backward()
+    return [v.grad for v in vs]
+
+
+class JacobianTest(unittest.TestCase):
+    def test_goldstein_matches_backward(self):
+        for point in ((1.0, 1.0), (0.0, -1.0), (-0.5, 0.3)):
+            jx, jy = jacobian(goldstein, *point)
+            gx, gy = scalar_grads(goldstein, *point)
+            self.assertAlmostEqual(float(jx), float(gx))
+            self.assertAlmostEqual(float(jy), float(gy))
+
+    def test_rosenbrock_vector(self):
+        x0 = np.array([0.0, 0.5, 1.5])
+        x1 = np.array([2.0, -1.0, 0.25])
+        jacs = jacobian(rosenbrock, x0, x1)
+        for i, jac in enumerate(jacs):
+            self.assertEqual(jac.shape, (3, 3))
+            np.testing.assert_allclose(
+                jac, numerical_jacobian(rosenbrock, (x0, x1), i),
+                rtol=1e-6, atol=1e-4)
+
+    def test_scalar_with_vector(self):
+        # batch_sum_to has to sum the broadcast of a over x back out
+        f = lambda a, x: a * x ** 2 + a ** 2 * x
+        a, x = np.array(1.5), np.array([1.0, -2.0, 3.0])
+        ja, jx = jacobian(f, a, x)
+        self.assertEqual(ja.shape, (3,))
+        self.assertEqual(jx.shape, (3, 3))
+        np.testing.assert_allclose(ja, numerical_jacobian(f, (a, x), 0),
+                                   rtol=1e-6)
+        np.testing.assert_allclose(jx, numerical_jacobian(f, (a, x), 1),
+                                   rtol=1e-6, atol=1e-8)
+
+    def test_size1_axis_with_matrix(self):
+        f = lambda w, x: w * x + w
+        w, x = np.array([[2.0], [3.0]]), np.arange(6.0).reshape(2, 3)
+        jw = jacobian(f, w, x)[0]
+        self.assertEqual(jw.shape, (2, 3, 2, 1))
+        np.testing.assert_allclose(jw, numerical_jacobian(f, (w, x), 0),
+                                   rtol=1e-6, atol=1e-8)
+
+    def test_independent_input(self):
+        jx, jy = jacobian(lambda x, y: x * 2.0, np.ones(2), np.ones(3))
+        np.testing.assert_array_equal(jy, np.zeros((2, 3)))
+
+
+class HessianTest(unittest.TestCase):
+    def second_derivative(self, f, x, eps=1e-4):
+        d = lambda x: scalar_grads(f, x)[0]
+        return (d(x + eps) - d(x - eps)) / (2 * eps)
+
+    def test_rosenbrock(self):
+        f = lambda x: rosenbrock(x, 2.0)
+        for x in (0.0, 0.5, -1.0):
+            h = hessian(f, np.array(x))
+            self.assertAlmostEqual(float(h), self.second_derivative(f, x),
+                                   places=4)
+
+    def test_goldstein_vector_is_diagonal(self):
+        f = lambda x: goldstein(x, 1.0)
+        x = np.array([0.0, 0.5, -0.25])
+        h = hessian(f, x)
+        expected = np.diag([self.second_derivative(f, xi) for xi in x])
+        np.testing.assert_allclose(h, expected, rtol=1e-5, atol=1e-2)
+
+    def test_linear(self):
+        h = hessian(lambda x: x * 3.0 + 1.0, np.ones(2))
+        np.testing.assert_array_equal(h, np.zeros((2, 2)))
+
+
+class HVPTest(unittest.TestCase):
+    def test_against_hessian(self):
+        f = lambda x: goldstein(x, 0.5)
+        x = np.array([0.0, 0.5, -0.25])
+        v = np.array([1.0, -2.0, 0.5])
+        np.testing.assert_allclose(hvp(f, x, v), hessian(f, x) @ v,
+                                   rtol=1e-10)
+
+    def test_batched(self):
+        f = lambda x: rosenbrock(x, 1.0) * x
+        x = np.array([0.5, 2.0])
+        vs = np.array([[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]])
+        h = hessian(f, x)
+        np.testing.assert_allclose(hvp(f, x, vs), vs @ h.T, rtol=1e-10)
+
+
+class VmapTest(unittest.TestCase):
+    def test_matches_loop(self):
+        xs = np.array([[0.0, 1.0], [0.5, -1.0], [2.0, 0.25]])
+        ys = np.array([[1.0, 2.0], [0.0, 0.5], [-1.0, 1.0]])
+        batched = vmap(goldstein)(xs, ys).data
+        looped = [goldstein(Variable(x), Variable(y)).data
+                  for x, y in zip(xs, ys)]
+        np.testing.assert_allclose(batched, looped)
+
+    def test_unbatched_argument(self):
+        w = Variable(np.array([1.0, 2.0, 3.0]))
+        a = np.array([0.5, -1.0])
+        f = lambda a, w: rosenbrock(a, w)
+        batched = vmap(f, in_axes=(0, None))(a, w).data
+        looped = [f(Variable(np.array(ai)), w).data for ai in a]
+        self.assertEqual(batched.shape, (2, 3))
+        np.testing.assert_allclose(batched, looped)
+
+    def test_gradient_of_loop_sum(self):
+        # the per-example gradients of a batched call are the ones a loop
+        # of scalar backward calls gives
+        xs = np.array([0.0, 0.5, -1.0, 2.0])
+        x = Variable(xs.copy())
+        vmap(lambda x: rosenbrock(x, 2.0))(x).backward()
+        expected = [scalar_grads(lambda x: rosenbrock(x, 2.0), xi)[0]
+                    for xi in xs]
+        np.testing.assert_allclose(x.grad, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()